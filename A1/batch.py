@@ -0,0 +1,253 @@
+"""Assignment 1 - Batch Simulation
+
+This file contains a NumPy engine which simulates several grocery store
+configurations at once, in lockstep, over the same stream of arrivals.
+
+The state of K stores with up to L lines each is kept in K x L arrays: the
+number of costumers in each line, the time at which the last of them will
+finish checking out, and a ring buffer with the finish time of every
+costumer in the line. Each arrival is then handled for all K stores with a
+handful of array operations: costumers who finished before the arrival
+leave their lines, and the line the new costumer joins is an argmin over
+(queue length, line index).
+
+Each store's wait statistics are kept the same way, so the engine
+reports the count, max, mean and variance of the waits, but none of the
+wait quantiles, which depend on the order the costumers finish in.
+
+This relies on two facts about the event-driven simulation when no line
+closes. First, an arrival is performed before any other event with the
+same timestamp, so a costumer finishing at time t is still in line for
+an arrival at time t. Second, a costumer who joins a line at time t
+finishes at max(t, f) + s, where f is the finish time of the costumer
+ahead of them and s is their checkout time.
+Traces with closing lines, stores with a single line and stores with
+random checkout times are handed to GroceryStoreSimulation instead.
+"""
+import numpy as np
+from simulation import GroceryStoreSimulation
+from store import GroceryStore
+from traces import CLOSE, as_trace
+
+# The wait statistics of GroceryStoreSimulation.run computed by the engine.
+WAIT_STATS = ('count', 'max', 'mean', 'variance')
+# The wait statistics of GroceryStoreSimulation.run which are not computed,
+# and are None in the results.
+MISSING_WAIT_STATS = ('p50', 'p95', 'p99')
+
+# The number of costumers each line has room for when the engine starts;
+# the room of every line doubles whenever some line fills up.
+INITIAL_ROOM = 64
+
+
+def simulate_batch(configs, event_file):
+    """Simulate each configuration of <configs> on the events of
+    <event_file>.
+
+    Return, for each configuration in order, a dictionary with the
+    'num_customers', 'total_time' and 'max_wait' statistics that
+    GroceryStoreSimulation.run would report, and the 'count', 'max', 'mean'
+    and 'variance' of its 'wait_stats', or None if some costumer could not
+    join any line. The mean and variance may differ from those of run in
+    the last digits, as the waits are added up in another order. The wait
+    quantiles are not computed, so 'p50', 'p95' and 'p99' are None.
+
+    >>> import os, tempfile
+    >>> from generate import write_events
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> events = os.path.join(directory.name, 'events.txt')
+    >>> write_events(events, 2000)
+    >>> configs = [{'cashier_count': 8, 'line_capacity': 1000},
+    ...            {'cashier_count': 6, 'express_count': 2,
+    ...             'self_serve_count': 2, 'line_capacity': 1000},
+    ...            {'cashier_count': 6, 'express_count': 2,
+    ...             'self_serve_count': 2, 'line_capacity': 3}]
+    >>> for config, stats in zip(configs, simulate_batch(configs, events)):
+    ...     try:
+    ...         expected = GroceryStoreSimulation(config).run(events)
+    ...     except IndexError:
+    ...         print(stats)
+    ...         continue
+    ...     waits, expected_waits = stats['wait_stats'], expected['wait_stats']
+    ...     print(all(stats[key] == expected[key] for key in
+    ...               ('num_customers', 'total_time', 'max_wait')),
+    ...           all(waits[key] == expected_waits[key]
+    ...               for key in ('count', 'max')),
+    ...           all(abs(waits[key] - expected_waits[key]) < 1e-6
+    ...               for key in ('mean', 'variance')))
+    True True True
+    True True True
+    None
+    >>> directory.cleanup()
+
+    @type configs: list[dict[str, object]]
+    @type event_file: str | Trace
+        A text event file, a binary trace file or a Trace.
+    @rtype: list[dict[str, object] | None]
+    """
+    trace = as_trace(event_file)
+    kinds = np.frombuffer(trace.kinds, dtype=np.int8)
+    stores = [GroceryStore(config) for config in configs]
+    results = [None] * len(configs)
+    batched = []
+    for k in range(len(configs)):
+        if len(stores[k].lines) > 1 and not (kinds == CLOSE).any() and \
+                all(line.distribution is None for line in stores[k].lines):
+            batched.append(k)
+        else:
+            results[k] = _simulate_one(configs[k], trace)
+    if batched:
+        stats = _simulate_lockstep([stores[k] for k in batched], trace)
+        for k, result in zip(batched, stats):
+            results[k] = result
+    return results
+
+
+def _simulate_one(config, trace):
+    """Return the statistics of <config> on <trace>, computed by
+    GroceryStoreSimulation, or None if some costumer could not join any
+    line.
+
+    @type config: dict[str, object]
+    @type trace: Trace
+    @rtype: dict[str, object] | None
+    """
+    try:
+        stats = GroceryStoreSimulation(config).run(trace)
+    except IndexError:
+        return None
+    wait_stats = dict.fromkeys(MISSING_WAIT_STATS)
+    for key in WAIT_STATS:
+        wait_stats[key] = stats['wait_stats'][key]
+    return {'num_customers': stats['num_customers'],
+            'total_time': stats['total_time'],
+            'max_wait': stats['max_wait'],
+            'wait_stats': wait_stats}
+
+
+def _simulate_lockstep(stores, trace):
+    """Return the statistics of each store of <stores> on the arrivals of
+    <trace>, or None for a store which could not place some costumer.
+
+    Precondition: <trace> has no CLOSE events, every store has at least two
+    lines and no costumer is in any of them.
+
+    @type stores: list[GroceryStore]
+    @type trace: Trace
+    @rtype: list[dict[str, object] | None]
+    """
+    timestamps = np.frombuffer(trace.timestamps, dtype=np.int64)
+    items = np.frombuffer(trace.values, dtype=np.int32)
+    count = len(stores)
+    width = max(len(store.lines) for store in stores)
+    stores_axis = np.arange(count)
+    lines_axis = np.arange(width)
+
+    # The line type of each line, as a row of the checkout time table;
+    # row 0 stands for the missing lines of the smaller stores.
+    line_types = []
+    type_rows = np.zeros((count, width), dtype=np.int64)
+    # The most items a costumer may have to join each line.
+    limits = np.zeros((count, width), dtype=np.int64)
+    present = np.zeros((count, width), dtype=bool)
+    capacity = np.zeros(count, dtype=np.int64)
+    for k in range(count):
+        capacity[k] = stores[k]._lines_capacity
+        for line in stores[k].lines:
+            if type(line) not in line_types:
+                line_types.append(type(line))
+            type_rows[k, line.id] = line_types.index(type(line)) + 1
+            if line.item_limit is None:
+                limits[k, line.id] = np.iinfo(np.int64).max
+            else:
+                limits[k, line.id] = line.item_limit
+            present[k, line.id] = True
+    most_items = int(items.max()) if len(items) else 0
+    checkout_times = np.zeros((len(line_types) + 1, most_items + 1),
+                              dtype=np.int64)
+    for row in range(len(line_types)):
+        line = line_types[row]()
+        for n in range(most_items + 1):
+            checkout_times[row + 1, n] = line.time_to_checkout(n)
+
+    # A line never holds more than its capacity, nor more than every
+    # costumer of the trace.
+    most_room = max(min(int(capacity.max()), len(timestamps)), 1)
+    size = min(INITIAL_ROOM, most_room)
+    finishes = np.zeros((count, width, size), dtype=np.int64)
+    heads = np.zeros((count, width), dtype=np.int64)
+    lengths = np.zeros((count, width), dtype=np.int64)
+    last_finish = np.zeros((count, width), dtype=np.int64)
+    failed = np.zeros(count, dtype=bool)
+    max_wait = np.full(count, -1, dtype=np.int64)
+    total_time = np.zeros(count, dtype=np.int64)
+    # The running mean of the waits of each store, and the sum of the
+    # squared differences between its waits and their mean.
+    mean_wait = np.zeros(count)
+    squares = np.zeros(count)
+    full = capacity[:, None]
+    unusable = np.iinfo(np.int64).max
+
+    for i in range(len(timestamps)):
+        t = int(timestamps[i])
+        n = int(items[i])
+        # Costumers who finished before <t> leave their lines, one per line
+        # per pass.
+        while True:
+            head_finish = np.take_along_axis(
+                finishes, heads[:, :, None], axis=2)[:, :, 0]
+            leaving = (lengths > 0) & (head_finish < t)
+            if not leaving.any():
+                break
+            heads = np.where(leaving, (heads + 1) % size, heads)
+            lengths -= leaving
+
+        closed = ~present | (lengths >= full) | (limits < n)
+        keys = np.where(closed, unusable, lengths * width + lines_axis)
+        chosen = keys.argmin(axis=1)
+        failed |= keys[stores_axis, chosen] == unusable
+
+        finish = np.maximum(t, last_finish[stores_axis, chosen]) + \
+            checkout_times[type_rows[stores_axis, chosen], n]
+        tails = (heads[stores_axis, chosen] +
+                 lengths[stores_axis, chosen]) % size
+        finishes[stores_axis, chosen, tails] = finish
+        lengths[stores_axis, chosen] += 1
+        last_finish[stores_axis, chosen] = finish
+        wait = finish - t
+        np.maximum(max_wait, wait, out=max_wait)
+        np.maximum(total_time, finish, out=total_time)
+        delta = wait - mean_wait
+        mean_wait += delta / (i + 1)
+        squares += delta * (wait - mean_wait)
+
+        if size < most_room and \
+                lengths[~failed].max(initial=0) == size:
+            # Unroll each ring buffer into the front of one twice as large.
+            order = (heads[:, :, None] + np.arange(size)) % size
+            grown = np.zeros((count, width, min(2 * size, most_room)),
+                             dtype=np.int64)
+            grown[:, :, :size] = np.take_along_axis(finishes, order, axis=2)
+            finishes = grown
+            size = grown.shape[2]
+            heads[:] = 0
+
+    results = []
+    for k in range(count):
+        if failed[k]:
+            results.append(None)
+        else:
+            wait_stats = dict.fromkeys(MISSING_WAIT_STATS)
+            wait_stats.update({'count': len(timestamps),
+                               'max': int(max_wait[k]), 'mean': None,
+                               'variance': None})
+            if len(timestamps) > 0:
+                wait_stats['mean'] = float(mean_wait[k])
+            if len(timestamps) > 1:
+                wait_stats['variance'] = \
+                    float(squares[k]) / (len(timestamps) - 1)
+            results.append({'num_customers': len(timestamps),
+                            'total_time': int(total_time[k]),
+                            'max_wait': int(max_wait[k]),
+                            'wait_stats': wait_stats})
+    return results
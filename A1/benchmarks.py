@@ -0,0 +1,451 @@
+"""Assignment 1 - Benchmarks
+
+This file contains timing benchmarks for the grocery store simulation.
+Run it directly to execute all of them and print the results.
+
+The suite (bench_suite) times the main stages of the simulation at growing
+numbers of costumers, on inputs from generate.py. Its results can be saved
+as a JSON baseline and later runs compared against it, e.g.
+
+    python benchmarks.py --suite --max_size 100000 --save baseline.json
+    python benchmarks.py --suite --max_size 100000 --compare baseline.json
+
+which prints every stage that got slower than the baseline by more than
+the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import tracemalloc
+from operator import attrgetter
+from timeit import default_timer
+from container import PriorityQueue, CalendarQueue
+from event import JoinLine, CheckingOut, FinishCheckingOut, create_event_list
+from generate import write_events
+from simulation import GroceryStoreSimulation
+from store import Costumer, GroceryStore
+from traces import create_event_list_mmap
+
+
+def bench_same_timestamp_burst(n=1000000):
+    """Time a PriorityQueue receiving <n> events with the same timestamp.
+
+    This is a regression benchmark: the queue must return every event, in
+    the order in which they were added.
+
+    Return a dictionary with the number of events and the seconds spent
+    adding and removing them.
+
+    @type n: int
+    @rtype: dict[str, object]
+    """
+    events = [JoinLine(0) for _ in range(n)]
+    pq = PriorityQueue(key=attrgetter('timestamp'))
+
+    start = default_timer()
+    for event in events:
+        pq.add(event)
+    added = default_timer()
+    removed = []
+    while not pq.is_empty():
+        removed.append(pq.remove())
+    end = default_timer()
+
+    assert len(removed) == n, 'events were lost by the queue'
+    assert all(a is b for a, b in zip(removed, events)), \
+        'events with the same timestamp were not removed in FIFO order'
+    return {'events': n,
+            'add_seconds': added - start,
+            'remove_seconds': end - added}
+
+
+def bench_parsers(filename=None, n=500000, rounds=3):
+    """Compare the throughput of create_event_list and its mmap replacement.
+
+    If <filename> is None, a temporary event file with <n> events is used.
+
+    Return a dictionary with the size of the file and the throughput of
+    each parser in MB/s, the best of <rounds> runs.
+
+    @type filename: str | None
+    @type n: int
+    @type rounds: int
+    @rtype: dict[str, object]
+    """
+    if filename is None:
+        handle, path = tempfile.mkstemp(suffix='.txt')
+        os.close(handle)
+        try:
+            write_events(path, n, close_rate=0.01)
+            return bench_parsers(path, rounds=rounds)
+        finally:
+            os.remove(path)
+
+    megabytes = os.path.getsize(filename) / 1e6
+    results = {'megabytes': megabytes}
+    for name, parser in [('create_event_list', create_event_list),
+                         ('create_event_list_mmap', create_event_list_mmap)]:
+        results[name + '_mb_per_s'] = \
+            megabytes / _best_of(rounds, parser, filename)
+    return results
+
+
+def _bytes_per_costumer(classes, n):
+    """Return the average number of bytes allocated to build the objects of
+    one simulated costumer, measured over <n> costumers.
+
+    <classes> are the JoinLine, Costumer, CheckingOut and FinishCheckingOut
+    classes to instantiate.
+
+    @type classes: (type, type, type, type)
+    @type n: int
+    @rtype: float
+    """
+    join_line, costumer, checking_out, finish = classes
+    # The lists keeping the objects alive are built before measuring.
+    kept = [[None] * n for _ in range(4)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        cos = costumer('c', 5)
+        kept[0][i] = cos
+        kept[1][i] = join_line(0)
+        kept[2][i] = checking_out(0)
+        kept[3][i] = finish(0)
+        kept[1][i].cos = kept[2][i].cos = kept[3][i].cos = cos
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / n
+
+
+class _PlainEvent:
+    """An Event as it was before __slots__: its instances have a __dict__.
+    """
+
+    def __init__(self, timestamp):
+        """Initialize a _PlainEvent like Event.
+
+        @type self: _PlainEvent
+        @type timestamp: int
+        @rtype: None
+        """
+        self.timestamp = timestamp
+        self.line = None
+
+
+class _PlainCostumerEvent(_PlainEvent):
+    """A JoinLine, CheckingOut or FinishCheckingOut as they were before
+    __slots__.
+    """
+
+    def __init__(self, timestamp):
+        """Initialize a _PlainCostumerEvent like JoinLine.
+
+        @type self: _PlainCostumerEvent
+        @type timestamp: int
+        @rtype: None
+        """
+        super(_PlainCostumerEvent, self).__init__(timestamp)
+        self.cos = None
+
+
+class _PlainCostumer:
+    """A Costumer as it was before __slots__.
+    """
+
+    def __init__(self, name, items):
+        """Initialize a _PlainCostumer like Costumer.
+
+        @type self: _PlainCostumer
+        @type name: str
+        @type items: int
+        @rtype: None
+        """
+        self.id = name
+        self.items = items
+        self.joined_store = None
+        self.total_time_waited = None
+
+
+def bench_memory_per_costumer(n=100000):
+    """Compare the memory used per simulated costumer with and without
+    __slots__ on the event and costumer classes.
+
+    The "dict" figure uses plain copies of the classes as they were before
+    __slots__, with the same attributes and no base class declaring
+    __slots__.
+
+    Return a dictionary with the bytes per costumer in both cases.
+
+    @type n: int
+    @rtype: dict[str, object]
+    """
+    slotted = (JoinLine, Costumer, CheckingOut, FinishCheckingOut)
+    plain = (_PlainCostumerEvent, _PlainCostumer, _PlainCostumerEvent,
+             _PlainCostumerEvent)
+    return {'slots_bytes_per_costumer': _bytes_per_costumer(slotted, n),
+            'dict_bytes_per_costumer': _bytes_per_costumer(plain, n)}
+
+
+# The store configuration used by the simulation benchmarks.
+BENCH_CONFIG = {'cashier_count': 6, 'express_count': 2,
+                'self_serve_count': 2, 'line_capacity': 1000}
+
+
+def bench_checkout_events(n=200000):
+    """Compare the event queue traffic of a simulation with and without
+    CheckingOut events, on a random event file of <n> events.
+
+    Return a dictionary with, for each mode, the number of queue operations
+    (adds and removes) and the seconds the simulation took.
+
+    @type n: int
+    @rtype: dict[str, object]
+    """
+    handle, path = tempfile.mkstemp(suffix='.txt')
+    os.close(handle)
+    results = {}
+    try:
+        write_events(path, n, lines=len(GroceryStore(BENCH_CONFIG).lines))
+        for name, trace in [('merged', False), ('traced', True)]:
+            sim = GroceryStoreSimulation(BENCH_CONFIG, trace_checkouts=trace)
+            start = default_timer()
+            sim.run(path)
+            results[name + '_seconds'] = default_timer() - start
+            # Every event added to the queue is also removed from it.
+            results[name + '_queue_operations'] = 2 * sim._events._count
+    finally:
+        os.remove(path)
+    return results
+
+
+def _hold(queue, n, spread, rng):
+    """Return the seconds taken by <n> "hold" operations on <queue>: remove
+    the next item, then add an item due a random 0 to <spread> time units
+    after it.
+
+    @type queue: Container
+    @type n: int
+    @type spread: int
+    @type rng: random.Random
+    @rtype: float
+    """
+    delays = [rng.randint(0, spread) for _ in range(n)]
+    start = default_timer()
+    for delay in delays:
+        queue.add(queue.remove() + delay)
+    return default_timer() - start
+
+
+def bench_calendar_queue(n=200000, size=10000):
+    """Compare a CalendarQueue with a heap-based PriorityQueue holding
+    <size> integer timestamps, over <n> hold operations.
+
+    In the dense case new timestamps land within 10 time units of the
+    current time, as in the simulation; in the sparse case they are spread
+    over a million time units, so the calendar's buckets each cover
+    hundreds of time units.
+
+    Return a dictionary with the seconds taken by each queue in each case.
+
+    @type n: int
+    @type size: int
+    @rtype: dict[str, object]
+    """
+    results = {}
+    for case, spread in [('dense', 10), ('sparse', 1000000)]:
+        for name, queue in [('heap', PriorityQueue()),
+                            ('calendar', CalendarQueue())]:
+            rng = random.Random(0)
+            for _ in range(size):
+                queue.add(rng.randint(0, spread))
+            results['{}_{}_seconds'.format(case, name)] = \
+                _hold(queue, n, spread, rng)
+    return results
+
+
+# The numbers of costumers the suite runs at.
+SUITE_SIZES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)
+
+
+def _best_of(rounds, function, *args):
+    """Return the fewest seconds <function> took on <args> over <rounds>
+    calls.
+
+    @type rounds: int
+    @type function: callable
+    @rtype: float
+    """
+    best = float('inf')
+    for _ in range(rounds):
+        start = default_timer()
+        function(*args)
+        best = min(best, default_timer() - start)
+    return best
+
+
+def _fill_and_drain(events):
+    """Add <events> to a PriorityQueue, then remove all of them.
+
+    @type events: list[Event]
+    @rtype: None
+    """
+    pq = PriorityQueue(key=attrgetter('timestamp'))
+    for event in events:
+        pq.add(event)
+    while not pq.is_empty():
+        pq.remove()
+
+
+def _assign_all(costumers):
+    """Assign each of <costumers> to a line of a BENCH_CONFIG store and make
+    them join it. The costumer at the head of a line leaves it when the line
+    reaches 4 costumers, so that the lines never fill up.
+
+    @type costumers: list[Costumer]
+    @rtype: None
+    """
+    store = GroceryStore(BENCH_CONFIG)
+    for cos in costumers:
+        line = store.assign_to_line(cos)
+        store.join_line(line, cos)
+        if len(line.costumers_list) == 4:
+            store.leave_line(line, line.costumers_list[0])
+
+
+def _run(event_file):
+    """Run a BENCH_CONFIG store simulation on <event_file>.
+
+    @type event_file: str
+    @rtype: None
+    """
+    GroceryStoreSimulation(BENCH_CONFIG).run(event_file)
+
+
+def bench_suite(sizes=SUITE_SIZES, rounds=3):
+    """Time create_event_list, PriorityQueue, assign_to_line and a full
+    simulation run at each number of costumers in <sizes>.
+
+    Each stage is timed <rounds> times on up to 10 ** 5 costumers, and
+    once on more, and the best time is kept.
+
+    Return a dictionary mapping each stage to a dictionary of the seconds
+    it took, by number of costumers.
+
+    @type sizes: iterable[int]
+    @type rounds: int
+    @rtype: dict[str, dict[str, float]]
+    """
+    results = {'create_event_list': {}, 'priority_queue': {},
+               'assign_to_line': {}, 'run': {}}
+    for n in sizes:
+        handle, path = tempfile.mkstemp(suffix='.txt')
+        os.close(handle)
+        try:
+            write_events(path, n, lines=len(GroceryStore(BENCH_CONFIG).lines))
+            times = rounds if n <= 10 ** 5 else 1
+            size = str(n)
+            results['create_event_list'][size] = \
+                _best_of(times, create_event_list, path)
+            events = create_event_list(path)
+            results['priority_queue'][size] = \
+                _best_of(times, _fill_and_drain, events)
+            costumers = [event.cos for event in events]
+            del events
+            results['assign_to_line'][size] = \
+                _best_of(times, _assign_all, costumers)
+            del costumers
+            results['run'][size] = _best_of(times, _run, path)
+        finally:
+            os.remove(path)
+    return results
+
+
+def save_baseline(filename, results):
+    """Save the suite results <results> to <filename> as a JSON baseline.
+
+    @type filename: str
+    @type results: dict[str, dict[str, float]]
+    @rtype: None
+    """
+    with open(filename, 'w') as file:
+        json.dump({'python': platform.python_version(),
+                   'machine': platform.machine(),
+                   'results': results}, file, indent=2)
+
+
+def compare_baseline(filename, results, tolerance=0.2):
+    """Return the regressions of the suite results <results> against the
+    JSON baseline in <filename>.
+
+    A regression is a stage and number of costumers measured in both, which
+    took more than (1 + <tolerance>) times its baseline time.
+
+    >>> import tempfile
+    >>> path = tempfile.mkstemp()[1]
+    >>> save_baseline(path, {'run': {'1000': 1.0, '10000': 10.0}})
+    >>> compare_baseline(path, {'run': {'1000': 1.1, '10000': 13.0}})
+    [('run', '10000', 10.0, 13.0)]
+    >>> os.remove(path)
+
+    @type filename: str
+    @type results: dict[str, dict[str, float]]
+    @type tolerance: float
+    @rtype: list[(str, str, float, float)]
+        The stage, number of costumers, baseline and new time of each
+        regression.
+    """
+    with open(filename, 'r') as file:
+        baseline = json.load(file)['results']
+    regressions = []
+    for stage in sorted(results):
+        for size, seconds in sorted(results[stage].items(),
+                                    key=lambda item: int(item[0])):
+            before = baseline.get(stage, {}).get(size)
+            if before is not None and seconds > before * (1 + tolerance):
+                regressions.append((stage, size, before, seconds))
+    return regressions
+
+
+def main(argv=None):
+    """Run the benchmarks selected by the command line arguments <argv>.
+
+    @type argv: list[str] | None
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Benchmark the grocery store simulation.')
+    parser.add_argument('--suite', action='store_true',
+                        help='run the suite instead of the other benchmarks')
+    parser.add_argument('--max_size', type=int, default=SUITE_SIZES[-1],
+                        help='the largest number of costumers of the suite')
+    parser.add_argument('--save', metavar='FILE',
+                        help='save the suite results as a baseline')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='compare the suite results with a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if not args.suite:
+        print(bench_same_timestamp_burst())
+        print(bench_parsers())
+        print(bench_memory_per_costumer())
+        print(bench_checkout_events())
+        print(bench_calendar_queue())
+        return
+    results = bench_suite([n for n in SUITE_SIZES if n <= args.max_size])
+    print(json.dumps(results, indent=2))
+    if args.compare is not None:
+        for stage, size, before, after in compare_baseline(
+                args.compare, results, args.tolerance):
+            print('REGRESSION {} at {} costumers: {:.4f}s -> {:.4f}s'.format(
+                stage, size, before, after))
+    if args.save is not None:
+        save_baseline(args.save, results)
+
+
+if __name__ == '__main__':
+    main()
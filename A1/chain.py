@@ -0,0 +1,164 @@
+"""Assignment 1 - Store Chains
+
+This file simulates a chain of independent grocery stores, each with its
+own configuration and event trace, in parallel.
+
+The stores are listed in a JSON manifest:
+
+    [{"name": "downtown", "config": "downtown.json",
+      "trace": "downtown.txt"},
+     {"name": "airport", "config": {"cashier_count": 2, ...},
+      "trace": "airport.gst"}]
+
+where a config is a configuration file or the configuration itself, and a
+trace is a text event file or a binary trace file (see traces.py). Relative
+paths are relative to the manifest.
+
+Idle worker processes take the next store as soon as they finish one, and
+the stores with the largest traces are handed out first, so that a big
+store does not start last and leave the other workers idle.
+
+It can also be run as a script, e.g.
+
+    python chain.py manifest.json --processes 8
+
+which prints one JSON line of statistics per store as soon as the store
+finishes, then a last line with the statistics of the whole chain.
+"""
+import argparse
+import json
+import os
+import sys
+from multiprocessing import Pool
+from timeit import default_timer
+from simulation import GroceryStoreSimulation
+from sweep import stats_row
+
+
+def load_manifest(filename):
+    """Return the stores listed in the manifest <filename>, with their paths
+    made relative to the current directory.
+
+    @type filename: str
+    @rtype: list[dict[str, object]]
+    """
+    with open(filename, 'r') as file:
+        stores = json.load(file)
+    directory = os.path.dirname(filename)
+    for i in range(len(stores)):
+        store = dict(stores[i])
+        store.setdefault('name', 'store{}'.format(i))
+        if isinstance(store['config'], str):
+            store['config'] = os.path.join(directory, store['config'])
+        store['trace'] = os.path.join(directory, store['trace'])
+        stores[i] = store
+    return stores
+
+
+def _simulate_store(store):
+    """Return the statistics row of one simulation of <store>.
+
+    @type store: dict[str, object]
+    @rtype: dict[str, object]
+    """
+    start = default_timer()
+    try:
+        stats = GroceryStoreSimulation(store['config']).run(store['trace'])
+    except IndexError as error:
+        # The store could not take every costumer.
+        row = stats_row({'name': store['name']}, None, str(error))
+    else:
+        row = stats_row({'name': store['name']}, stats)
+    row['seconds'] = default_timer() - start
+    return row
+
+
+def simulate_chain(stores, processes=None):
+    """Simulate each store of <stores> using a pool of <processes> worker
+    processes.
+
+    Yield the statistics row of each store as soon as it finishes, in the
+    order they finish.
+
+    @type stores: list[dict[str, object]]
+    @type processes: int | None
+        The number of worker processes; the number of CPUs if None.
+    @rtype: iterator[dict[str, object]]
+    """
+    largest_first = sorted(stores,
+                           key=lambda store: os.path.getsize(store['trace']),
+                           reverse=True)
+    with Pool(processes) as pool:
+        for row in pool.imap_unordered(_simulate_store, largest_first,
+                                       chunksize=1):
+            yield row
+
+
+def chain_summary(rows):
+    """Return the statistics of a whole chain of stores, given the rows of
+    its stores.
+
+    The wait statistics of the chain are those of all its costumers
+    together; stores which failed are only counted under 'failed'.
+
+    >>> summary = chain_summary([{'num_customers': 2, 'total_time': 10,
+    ...                           'max_wait': 5, 'wait_mean': 3.0,
+    ...                           'error': None},
+    ...                          {'num_customers': 6, 'total_time': 30,
+    ...                           'max_wait': 4, 'wait_mean': 1.0,
+    ...                           'error': None},
+    ...                          {'error': 'no line can take costumer c'}])
+    >>> summary == {'stores': 3, 'failed': 1, 'num_customers': 8,
+    ...             'total_time': 30, 'max_wait': 5, 'wait_mean': 1.5}
+    True
+
+    @type rows: list[dict[str, object]]
+    @rtype: dict[str, object]
+    """
+    summary = {'stores': len(rows), 'failed': 0, 'num_customers': 0,
+               'total_time': 0, 'max_wait': -1, 'wait_mean': None}
+    waited = 0
+    for row in rows:
+        if row['error'] is not None:
+            summary['failed'] += 1
+            continue
+        summary['num_customers'] += row['num_customers']
+        summary['total_time'] = max(summary['total_time'], row['total_time'])
+        summary['max_wait'] = max(summary['max_wait'], row['max_wait'])
+        if row['wait_mean'] is not None:
+            waited += row['wait_mean'] * row['num_customers']
+    if summary['num_customers'] > 0:
+        summary['wait_mean'] = waited / summary['num_customers']
+    return summary
+
+
+def main(argv=None):
+    """Simulate the chain of stores of the command line arguments <argv>.
+
+    @type argv: list[str] | None
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Simulate a chain of grocery stores in parallel.')
+    parser.add_argument('manifest')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the JSON lines to FILE instead')
+    args = parser.parse_args(argv)
+
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        rows = []
+        for row in simulate_chain(load_manifest(args.manifest),
+                                  args.processes):
+            rows.append(row)
+            output.write(json.dumps(row) + '\n')
+            output.flush()
+        output.write(json.dumps({'chain': chain_summary(rows)}) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 This file contains the classes representing the Container
 and Priority Queue data types.
 """
+import heapq
+from collections import deque
 
 
 class Container:
@@ -28,6 +30,14 @@ class Container:
         """
         raise NotImplementedError
 
+    def peek(self):
+        """Return the item that remove() would return, without removing it.
+
+        @type self: Container
+        @rtype: object
+        """
+        raise NotImplementedError
+
     def is_empty(self):
         """Return True iff this Container is empty.
 
@@ -46,7 +56,10 @@ class PriorityQueue(Container):
     removed.
 
     Priority is defined by the rich comparison methods for the objects in the
-    container (__lt__, __le__, __gt__, __ge__).
+    container (__lt__, __le__, __gt__, __ge__), or, if the queue was created
+    with a <key> function, by the values that function returns. In the latter
+    case the items themselves are never compared, not even for equality, so
+    any number of items with the same key can be stored.
 
     If x < y, then x has a *HIGHER* priority than y. (Intuitively, "priority 1"
     is more important than "priority 10".)
@@ -54,20 +67,34 @@ class PriorityQueue(Container):
     All objects in the container must be of the same type.
     """
     # === Private Attributes ===
-    # @type _items: list
-    #     The items stored in the priority queue.
+    # @type _items: list[(object, int, object)]
+    #     The items stored in the priority queue, as triples of
+    #     (priority, sequence number, item).
+    # @type _count: int
+    #     The sequence number that will be given to the next inserted item.
+    # @type _key: (object) -> object | None
+    #     The function computing the priority of an item, or None if items
+    #     are their own priority.
     #
     # === Representation Invariants ===
-    # _items is a sorted list, where the front item is the one with the
-    # highest priority.
+    # _items is a binary min-heap (as maintained by the heapq module), so
+    # _items[0] is the triple holding the item with the highest priority.
+    # Sequence numbers are unique and increase with insertion order, so two
+    # items with the same priority are ordered first-in, first-out and
+    # comparisons never reach the item itself.
 
-    def __init__(self):
+    def __init__(self, key=None):
         """Initialize an empty PriorityQueue.
 
         @type self: PriorityQueue
+        @type key: (object) -> object | None
+            A function returning the priority of an item. If None, items are
+            compared directly.
         @rtype: None
         """
         self._items = []
+        self._count = 0
+        self._key = key
 
     def remove(self):
         """Remove and return the next item from this PriorityQueue.
@@ -91,7 +118,25 @@ class PriorityQueue(Container):
         >>> pq.remove()
         'mona'
         """
-        return self._items.pop(0)
+        return heapq.heappop(self._items)[2]
+
+    def peek(self):
+        """Return the next item of this PriorityQueue without removing it.
+
+        Precondition: <self> should not be empty.
+
+        @type self: PriorityQueue
+        @rtype: object
+
+        >>> pq = PriorityQueue()
+        >>> pq.add('fred')
+        >>> pq.add('chris')
+        >>> pq.peek()
+        'chris'
+        >>> pq.remove()
+        'chris'
+        """
+        return self._items[0][2]
 
     def is_empty(self):
         """
@@ -116,19 +161,265 @@ class PriorityQueue(Container):
         @type item: object
         @rtype: None
 
-        >>> pq = PriorityQueue
+        >>> pq = PriorityQueue()
         >>> pq.is_empty()
         True
         >>> pq.add('Kenneth')
         >>> pq.is_empty()
         False
+        >>> pq = PriorityQueue(key=len)
+        >>> pq.add('bob')
+        >>> pq.add('amy')
+        >>> pq.add('al')
+        >>> [pq.remove() for _ in range(3)]
+        ['al', 'bob', 'amy']
+        """
+        if self._key is None:
+            priority = item
+        else:
+            priority = self._key(item)
+        heapq.heappush(self._items, (priority, self._count, item))
+        self._count += 1
+
+
+class CalendarQueue(Container):
+    """A queue of items with non-negative integer timestamps, which operates
+    in timestamp order.
+
+    Items are removed in increasing timestamp order, and items with the same
+    timestamp in FIFO order, like in a PriorityQueue keyed on timestamps.
+
+    Items are kept in a ring of buckets, each covering <span> consecutive
+    timestamps, in a window of as many spans as there are buckets starting
+    at the current time. Adding or removing an item in the window takes
+    constant time on average, plus a scan over the empty buckets when time
+    moves forward. Items beyond the window wait in a heap and are moved into
+    the buckets as the window reaches them.
+
+    As in a classic calendar queue, the ring is resized as the queue grows
+    and shrinks: the number of buckets is kept between half and twice the
+    number of items, and the span is then set to three times the average
+    spacing of the next items, so that a bucket holds a few items and few
+    buckets are empty whether the timestamps are dense or sparse.
+
+    Once an item has been removed, no item with an earlier timestamp may be
+    added.
+    """
+    # === Private Attributes ===
+    # @type _key: (object) -> int
+    #     The function returning the timestamp of an item.
+    # @type _width: int
+    #     The number of buckets.
+    # @type _span: int
+    #     The number of consecutive timestamps each bucket covers.
+    # @type _buckets: list[deque[(int, int, object)]]
+    #     Sorted runs of (timestamp, sequence number, item).
+    #     _buckets[s % _width] holds the items whose slot, timestamp //
+    #     _span, is s, for each slot s of the window.
+    # @type _start: int
+    #     The current time; no item has an earlier timestamp.
+    # @type _cursor: int
+    #     A slot of the window such that the buckets of the slots from that
+    #     of _start up to but excluding _cursor are empty.
+    # @type _in_window: int
+    #     The number of items in the buckets.
+    # @type _overflow: list[(int, int, object)]
+    #     A heap of (timestamp, sequence number, item) for the items whose
+    #     slot is at or after the end of the window.
+    # @type _count: int
+    #     The sequence number that will be given to the next item.
+    # @type _size: int
+    #     The number of items.
+
+    # The fewest buckets the ring is shrunk to.
+    MIN_WIDTH = 16
+    # The number of next items whose spacing sets the span on a resize.
+    SAMPLE_SIZE = 25
+
+    def __init__(self, key=None, width=1024):
+        """Initialize an empty CalendarQueue.
+
+        @type self: CalendarQueue
+        @type key: (object) -> int | None
+            A function returning the timestamp of an item. If None, items
+            are their own timestamps.
+        @type width: int
+            The initial number of buckets, each covering one timestamp.
+        @rtype: None
+        """
+        self._key = key
+        self._width = max(width, self.MIN_WIDTH)
+        self._span = 1
+        self._buckets = [deque() for _ in range(self._width)]
+        self._start = 0
+        self._cursor = 0
+        self._in_window = 0
+        self._overflow = []
+        self._count = 0
+        self._size = 0
+
+    def add(self, item):
+        """Add <item> to this CalendarQueue.
+
+        @type self: CalendarQueue
+        @type item: object
+        @rtype: None
+
+        >>> cq = CalendarQueue(width=4)
+        >>> for t in [9, 2, 30, 2, 5]:
+        ...     cq.add(t)
+        >>> [cq.remove() for _ in range(5)]
+        [2, 2, 5, 9, 30]
         """
-        if self.is_empty():
-            self._items.append(item)
+        timestamp = item if self._key is None else self._key(item)
+        if timestamp < self._start:
+            raise ValueError('timestamp {} is before the current time {}'
+                             .format(timestamp, self._start))
+        entry = (timestamp, self._count, item)
+        self._count += 1
+        self._size += 1
+        slot = timestamp // self._span
+        if slot < self._start // self._span + self._width:
+            bucket = self._buckets[slot % self._width]
+            # Most items go after the others of their bucket.
+            if not bucket or bucket[-1] < entry:
+                bucket.append(entry)
+            else:
+                _insert(bucket, entry)
+            self._in_window += 1
+            if slot < self._cursor:
+                self._cursor = slot
         else:
-            for event in self._items:
-                if event > item:
-                    self._items.insert(self._items.index(event), item)
-                    return
-            if item not in self._items:
-                self._items.append(item)
+            heapq.heappush(self._overflow, entry)
+        if self._size > 2 * self._width:
+            self._resize(2 * self._width)
+
+    def _resize(self, width):
+        """Rebuild the ring with <width> buckets, and a span fitted to the
+        spacing of the next items.
+
+        @type self: CalendarQueue
+        @type width: int
+        @rtype: None
+        """
+        entries = self._overflow
+        for bucket in self._buckets:
+            entries.extend(bucket)
+        entries.sort()
+        sample = entries[:self.SAMPLE_SIZE]
+        if len(sample) > 1:
+            self._span = max(1, 3 * (sample[-1][0] - sample[0][0]) //
+                             (len(sample) - 1))
+        self._width = width
+        self._buckets = [deque() for _ in range(width)]
+        first = self._start // self._span
+        self._cursor = first
+        self._in_window = 0
+        self._overflow = []
+        end = (first + width) * self._span
+        # The entries are sorted, so each goes at the end of its bucket, and
+        # those beyond the window already form a heap.
+        for i in range(len(entries)):
+            if entries[i][0] >= end:
+                self._overflow = entries[i:]
+                break
+            self._buckets[entries[i][0] // self._span % width].append(
+                entries[i])
+            self._in_window += 1
+
+    def _next_slot(self):
+        """Return the slot of the next item in the buckets.
+
+        Precondition: the buckets should not be empty.
+
+        @type self: CalendarQueue
+        @rtype: int
+        """
+        buckets = self._buckets
+        width = self._width
+        cursor = self._cursor
+        while not buckets[cursor % width]:
+            cursor += 1
+        self._cursor = cursor
+        return cursor
+
+    def _move_window(self, start):
+        """Make <start> the current time, moving the overflow items the
+        window now covers into the buckets.
+
+        Precondition: no item in the buckets is before <start>.
+
+        @type self: CalendarQueue
+        @type start: int
+        @rtype: None
+        """
+        self._start = start
+        first = start // self._span
+        if self._cursor < first:
+            self._cursor = first
+        end = (first + self._width) * self._span
+        overflow = self._overflow
+        while overflow and overflow[0][0] < end:
+            entry = heapq.heappop(overflow)
+            _insert(self._buckets[entry[0] // self._span % self._width],
+                    entry)
+            self._in_window += 1
+
+    def remove(self):
+        """Remove and return the next item from this CalendarQueue.
+
+        Precondition: <self> should not be empty.
+
+        @type self: CalendarQueue
+        @rtype: object
+        """
+        if self._in_window == 0:
+            self._move_window(self._overflow[0][0])
+        bucket = self._buckets[self._next_slot() % self._width]
+        timestamp, _, item = bucket.popleft()
+        self._in_window -= 1
+        self._size -= 1
+        if timestamp > self._start:
+            self._move_window(timestamp)
+        if 2 * self._size < self._width and self._width > self.MIN_WIDTH:
+            self._resize(self._width // 2)
+        return item
+
+    def peek(self):
+        """Return the next item of this CalendarQueue without removing it.
+
+        Precondition: <self> should not be empty.
+
+        @type self: CalendarQueue
+        @rtype: object
+        """
+        if self._in_window == 0:
+            return self._overflow[0][2]
+        return self._buckets[self._next_slot() % self._width][0][2]
+
+    def is_empty(self):
+        """Return True iff this CalendarQueue is empty.
+
+        @type self: CalendarQueue
+        @rtype: bool
+        """
+        return self._in_window == 0 and not self._overflow
+
+
+def _insert(run, entry):
+    """Insert <entry> into the sorted deque <run>, keeping it sorted.
+
+    Entries mostly arrive nearly in order, so the place of <entry> is
+    searched for from the end.
+
+    @type run: deque[(int, int, object)]
+    @type entry: (int, int, object)
+    @rtype: None
+    """
+    if not run or run[-1] < entry:
+        run.append(entry)
+        return
+    i = len(run) - 1
+    while i > 0 and entry < run[i - 1]:
+        i -= 1
+    run.insert(i, entry)
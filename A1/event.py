@@ -20,6 +20,8 @@ class Event:
     @type line: CheckoutLine
         The line related to the event.
     """
+    __slots__ = ('timestamp', 'line')
+
     def __init__(self, timestamp):
         """Initialize an Event with a given timestamp.
 
@@ -168,6 +170,8 @@ class JoinLine(Event):
     @type cos: Costumer
         The costumer related to this event.
     """
+    __slots__ = ('cos',)
+
     def __init__(self, timestamp):
         """Initialize this subclass.
 
@@ -190,15 +194,13 @@ class JoinLine(Event):
             A list of events generated by performing this event.
         """
         self.line = store.assign_to_line(self.cos)
-        self.line.costumers_list.append(self.cos)
+        store.join_line(self.line, self.cos)
         if self.cos.joined_store is None:
             self.cos.joined_store = self.timestamp
         event_spawned = []
         if len(self.line.costumers_list) == 1:
-            event = CheckingOut(self.timestamp)
-            event.cos = self.cos
-            event.line = self.line
-            event_spawned.append(event)
+            event_spawned.append(
+                _start_checkout(store, self.line, self.cos, self.timestamp))
         return event_spawned
 
 
@@ -208,10 +210,16 @@ class CheckingOut(Event):
     A costumer takes different amount of time to checkout depending on the line
     he/she is in.
 
+    These events are only spawned when the store traces checkouts (see
+    GroceryStore.trace_checkouts); otherwise the FinishCheckingOut event is
+    scheduled directly when a costumer reaches the head of a line.
+
     === Attributes ===
     @type cos: Costumer
         The costumer related to this event.
     """
+    __slots__ = ('cos',)
+
     def __init__(self, timestamp):
         """Initialize this subclass.
 
@@ -233,7 +241,7 @@ class CheckingOut(Event):
         @rtype: list[Event]
             A list of events generated by performing this event.
         """
-        time_taken = self.line.time_to_checkout(self.cos.items)
+        time_taken = checkout_time(self.line, self.cos.items)
         event = FinishCheckingOut(self.timestamp + time_taken)
         event.cos = self.cos
         event.line = self.line
@@ -250,6 +258,8 @@ class FinishCheckingOut(Event):
     @type cos: Costumer
         The costumer related to this event.
     """
+    __slots__ = ('cos',)
+
     def __init__(self, timestamp):
         """Initialize this subclass.
 
@@ -271,13 +281,11 @@ class FinishCheckingOut(Event):
         @rtype: list[Event]
             A list of events generated by performing this event.
         """
-        self.line.costumers_list.remove(self.cos)
+        store.leave_line(self.line, self.cos)
         event_spawned = []
         if len(self.line.costumers_list) > 0:
-            event = CheckingOut(self.timestamp)
-            event.cos = self.line.costumers_list[0]
-            event.line = self.line
-            event_spawned.append(event)
+            event_spawned.append(_start_checkout(
+                store, self.line, self.line.costumers_list[0], self.timestamp))
         self.cos.total_time_waited = self.timestamp - self.cos.joined_store
         return event_spawned
 
@@ -288,6 +296,8 @@ class CloseLine(Event):
     If a checkout line closes the costumer in front of the line keeps his/her
     spot and the others (if there are any) are assigned to available lines.
     """
+    __slots__ = ()
+
     def __init__(self, timestamp):
         """Initialize this subclass.
 
@@ -310,14 +320,100 @@ class CloseLine(Event):
         """
         store.close(self.line)
         events_spawned = []
-        if len(self.line.costumers_list) > 1:
-            for i in range(len(self.line.costumers_list[1:])):
-                event = JoinLine(self.timestamp + i)
-                event.cos = self.line.costumers_list[-1]
-                self.line.costumers_list.pop()
-                events_spawned.append(event)
+        waiting = self.line.costumers_list
+        for i in range(len(waiting) - 1):
+            event = JoinLine(self.timestamp + i)
+            event.cos = waiting.pop()
+            events_spawned.append(event)
         return events_spawned
 
+    def do_in_bulk(self, store, horizon):
+        """Perform this event, then the JoinLine events it would spawn which
+        would be performed before any other event.
+
+        The i-th costumer displaced joins a line at time timestamp + i, as
+        with do. The JoinLine events are performed in order, until one is
+        due at or after <horizon>, or after an event they spawned.
+
+        @type self: CloseLine
+        @type store: GroceryStore
+        @type horizon: int | float
+            The timestamp of the next event from the event file or the event
+            queue, or infinity if there is none.
+        @rtype: list[Event]
+            The JoinLine events which were not performed, followed by the
+            events spawned by those which were. Queued in this order, they
+            are performed in the same order as the events spawned by do.
+        """
+        joins = self.do(store)
+        spawned = []
+        for i in range(len(joins)):
+            join = joins[i]
+            if join.timestamp >= horizon:
+                return joins[i:] + spawned
+            for event in join.do(store):
+                spawned.append(event)
+                # An event spawned now is performed before the JoinLine
+                # events due after it.
+                horizon = min(horizon, event.timestamp + 1)
+        return spawned
+
+
+def checkout_time(line, items):
+    """Return the time it takes to checkout <items> items at <line>.
+
+    The time is looked up in the line's precomputed table when possible.
+
+    @type line: CheckoutLine
+    @type items: int
+    @rtype: int
+    """
+    table = line.service_times
+    if items < len(table):
+        return table[items]
+    return line.time_to_checkout(items)
+
+
+def _start_checkout(store, line, cos, timestamp):
+    """Return the event spawned when the costumer <cos> reaches the head of
+    the checkout line <line> at time <timestamp>.
+
+    This is a CheckingOut event if <store> traces checkouts, and otherwise
+    the FinishCheckingOut event that CheckingOut would have spawned.
+
+    @type store: GroceryStore
+    @type line: CheckoutLine
+    @type cos: Costumer
+    @type timestamp: int
+    @rtype: Event
+    """
+    if store.trace_checkouts:
+        event = CheckingOut(timestamp)
+    else:
+        event = FinishCheckingOut(timestamp + checkout_time(line, cos.items))
+    event.cos = cos
+    event.line = line
+    return event
+
+
+def _parse_event(line):
+    """Return the Event described by the raw event <line>.
+
+    @type line: str
+        A line of an event file, in the format specified by the assignment
+        handout.
+    @rtype: Event
+    """
+    tokens = line.split()
+    if tokens[1] == 'Arrive':
+        event = JoinLine(int(tokens[0]))
+        event.cos = Costumer(tokens[2], int(tokens[-1]))
+    else:
+        event = CloseLine(int(tokens[0]))
+        event.line = int(tokens[-1])
+        # See the comment in simulation.py regarding the line above.
+    return event
+
 
 def create_event_list(filename):
     """Return a list of Events based on raw list of events in <filename>.
@@ -332,14 +428,31 @@ def create_event_list(filename):
     events = []
     with open(filename, 'r') as file:
         for line in file:
-            tokens = line.split()
-            if tokens[1] == 'Arrive':
-                event = JoinLine(int(tokens[0]))
-                event.cos = Costumer(tokens[2], int(tokens[-1]))
-            else:
-                event = CloseLine(int(tokens[0]))
-                event.line = int(tokens[-1])
-                # See the comment in simulation.py regarding the line above.
-
-            events.append(event)
+            events.append(_parse_event(line))
     return events
+
+
+def iter_events(filename):
+    """Yield the Events in <filename> one at a time, in file order.
+
+    Unlike create_event_list, only one event is held in memory at a time.
+    The file must be sorted by timestamp; a ValueError is raised as soon as
+    an event older than the one before it is read.
+
+    Precondition: the file stored at <filename> is in the format specified
+    by the assignment handout.
+
+    @type filename: str
+        The name of a file that contains the list of events.
+    @rtype: generator[Event]
+    """
+    last = None
+    with open(filename, 'r') as file:
+        for number, line in enumerate(file, 1):
+            event = _parse_event(line)
+            if last is not None and event.timestamp < last:
+                raise ValueError('{}:{}: event at time {} comes after an '
+                                 'event at time {}'.format(
+                                     filename, number, event.timestamp, last))
+            last = event.timestamp
+            yield event
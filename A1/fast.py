@@ -0,0 +1,296 @@
+"""Assignment 1 - Fast Simulation Engine
+
+This file contains a second engine for GroceryStoreSimulation.run, selected
+with engine='fast'. It performs the same events as the object engine, in
+the same order, but represents each event as a tuple
+
+    (timestamp, seq, kind, costumer, line)
+
+of integers, where <seq> is the order in which the event was queued,
+<costumer> is the index of the costumer's arrival in the trace and <line>
+is a line id. Costumers and lines are rows of flat tables, and events are
+handled in a single loop instead of by Event.do methods, so no objects are
+allocated per event. As in GroceryStore, the shortest line is found with a
+tournament tree per item limit, kept as a plain list of integers.
+
+Run this file directly to compare the two engines on random traces and
+store configurations (see compare_engines).
+"""
+import os
+import random
+import sys
+import tempfile
+from array import array
+from collections import deque
+from heapq import heappush, heappop
+from generate import write_events
+from store import GroceryStore
+from traces import ARRIVE, as_trace
+
+# The kinds of events queued by the engine. Closures only come from the
+# trace, and are not queued.
+JOIN = 0
+CHECKOUT = 1
+FINISH = 2
+
+
+def simulate_fast(store, event_file, collector):
+    """Simulate <store> on the events of <event_file>, recording the wait of
+    each costumer in <collector>.
+
+    Return the number of costumers and the timestamp of the last event.
+
+    Precondition: no costumer is in any line of <store>.
+
+    @type store: GroceryStore
+        The store, with its trace_checkouts attribute set.
+    @type event_file: str | Trace
+        A text event file, a binary trace file or a Trace.
+    @type collector: StatsCollector
+    @rtype: (int, int)
+    """
+    trace = as_trace(event_file)
+    timestamps = trace.timestamps
+    kinds = trace.kinds
+    values = trace.values
+    count = len(timestamps)
+
+    lines = store.lines
+    size = max(len(lines), 1)
+    capacity = store._lines_capacity
+    traced = store.trace_checkouts
+    empty = float('inf')
+    queues = [deque() for _ in lines]
+    tables = [line.service_times for line in lines]
+    is_open = [store.is_open(line) for line in lines]
+    open_count = sum(is_open)
+    groups = {}
+    for line in lines:
+        groups.setdefault(line.item_limit, []).append(line.id)
+    # The item limit and tree of each group of lines. As in _LineIndex, the
+    # leaves of a tree hold the entries of its lines, their length times
+    # size plus their id, or empty if they are closed, and each node holds
+    # the smallest entry below it. leaves[l] is the leaf of line l in
+    # trees[l].
+    limits = []
+    trees = [None] * len(lines)
+    leaves = [0] * len(lines)
+    for limit, ids in groups.items():
+        first = 1
+        while first < len(ids):
+            first *= 2
+        tree = [empty] * (2 * first)
+        for k in range(len(ids)):
+            trees[ids[k]] = tree
+            leaves[ids[k]] = first + k
+            tree[first + k] = ids[k] if is_open[ids[k]] else empty
+        for node in range(first - 1, 0, -1):
+            tree[node] = min(tree[2 * node], tree[2 * node + 1])
+        limits.append((limit, tree))
+    # The time each costumer first joined a line.
+    joined = array('q', [-1]) * count
+
+    events = []
+    seq = 0
+    i = 0
+    costumers = 0
+    total_time = 0
+    while i < count or events:
+        if i < count and (not events or timestamps[i] <= events[0][0]):
+            timestamp = timestamps[i]
+            if kinds[i] == ARRIVE:
+                kind = JOIN
+                cos = i
+                costumers += 1
+            else:
+                kind = None
+                line_id = values[i]
+            i += 1
+        else:
+            timestamp, _, kind, cos, line_id = heappop(events)
+
+        if kind == JOIN:
+            items = values[cos]
+            only_line = open_count == 1
+            best = empty
+            for limit, tree in limits:
+                if (only_line or limit is None or items <= limit) and \
+                        tree[1] < best:
+                    best = tree[1]
+            length, line_id = divmod(best, size) if best != empty \
+                else (empty, None)
+            # The only open line takes everyone, whatever its length.
+            if line_id is None or not (only_line or length < capacity):
+                raise IndexError('no checkout line can take costumer {}'
+                                 .format(trace.ids[trace.costumers[cos]]))
+            queue = queues[line_id]
+            queue.append(cos)
+            _update(trees[line_id], leaves[line_id], best + size)
+            if joined[cos] < 0:
+                joined[cos] = timestamp
+            if len(queue) == 1:
+                if traced:
+                    heappush(events, (timestamp, seq, CHECKOUT, cos, line_id))
+                else:
+                    table = tables[line_id]
+                    heappush(events, (
+                        timestamp + (table[items] if items < len(table) else
+                                     lines[line_id].time_to_checkout(items)),
+                        seq, FINISH, cos, line_id))
+                seq += 1
+        elif kind == CHECKOUT:
+            items = values[cos]
+            table = tables[line_id]
+            heappush(events, (
+                timestamp + (table[items] if items < len(table) else
+                             lines[line_id].time_to_checkout(items)),
+                seq, FINISH, cos, line_id))
+            seq += 1
+        elif kind == FINISH:
+            queue = queues[line_id]
+            if queue[0] == cos:
+                queue.popleft()
+            else:
+                queue.remove(cos)
+            if is_open[line_id]:
+                tree = trees[line_id]
+                leaf = leaves[line_id]
+                _update(tree, leaf, tree[leaf] - size)
+            if queue:
+                head = queue[0]
+                if traced:
+                    heappush(events, (timestamp, seq, CHECKOUT, head, line_id))
+                else:
+                    items = values[head]
+                    table = tables[line_id]
+                    heappush(events, (
+                        timestamp + (table[items] if items < len(table) else
+                                     lines[line_id].time_to_checkout(items)),
+                        seq, FINISH, head, line_id))
+                seq += 1
+            collector.record(timestamp - joined[cos], lines[line_id])
+        else:
+            if not is_open[line_id]:
+                raise ValueError('line {} is already closed'.format(line_id))
+            is_open[line_id] = False
+            open_count -= 1
+            _update(trees[line_id], leaves[line_id], empty)
+            queue = queues[line_id]
+            for k in range(len(queue) - 1):
+                heappush(events, (timestamp + k, seq, JOIN, queue.pop(), None))
+                seq += 1
+        total_time = timestamp
+    return costumers, total_time
+
+
+def _update(tree, leaf, entry):
+    """Set the leaf <leaf> of the tournament tree <tree> to <entry>.
+
+    @type tree: list[int | float]
+    @type leaf: int
+    @type entry: int | float
+    @rtype: None
+    """
+    tree[leaf] = entry
+    node = leaf // 2
+    while node > 0:
+        left = tree[2 * node]
+        right = tree[2 * node + 1]
+        smallest = left if left < right else right
+        if tree[node] == smallest:
+            # The nodes above are unchanged too.
+            return
+        tree[node] = smallest
+        node //= 2
+
+
+def compare_engines(config, event_file, trace_checkouts=False):
+    """Run the object and fast engines of GroceryStoreSimulation on
+    <config> and <event_file>, and return the statistics which differ.
+
+    A failure to place a costumer counts as the statistic 'error', whose
+    value is the exception message.
+
+    @type config: dict[str, object]
+    @type event_file: str | Trace
+    @type trace_checkouts: bool
+    @rtype: dict[str, (object, object)]
+        The object engine's and the fast engine's value of each statistic
+        which differs.
+    """
+    # simulation.py imports this file.
+    from simulation import GroceryStoreSimulation
+    results = []
+    for engine in ('object', 'fast'):
+        simulation = GroceryStoreSimulation(config,
+                                            trace_checkouts=trace_checkouts)
+        try:
+            stats = simulation.run(event_file, engine=engine)
+        except IndexError as error:
+            stats = {'error': str(error)}
+        results.append(stats)
+    differences = {}
+    for key in sorted(set(results[0]) | set(results[1])):
+        if results[0].get(key) != results[1].get(key):
+            differences[key] = (results[0].get(key), results[1].get(key))
+    return differences
+
+
+def _random_config(rng):
+    """Return a random store configuration.
+
+    @type rng: random.Random
+    @rtype: dict[str, object]
+    """
+    config = {'cashier_count': rng.randint(0, 4),
+              'express_count': rng.randint(0, 3),
+              'self_serve_count': rng.randint(0, 3),
+              'line_capacity': rng.choice([1, 3, 10, 1000])}
+    if rng.random() < 0.3:
+        config['line_types'] = {'Bagger': {'fixed': rng.randint(0, 9),
+                                           'per_item': rng.randint(1, 3),
+                                           'item_limit': rng.choice(
+                                               [None, 5, 200])}}
+        config['line_counts'] = {'Bagger': rng.randint(1, 2)}
+    if sum(config[key] for key in ('cashier_count', 'express_count',
+                                   'self_serve_count')) == 0:
+        config['cashier_count'] = 1
+    return config
+
+
+def main(runs=200, seed=0):
+    """Compare the two engines on <runs> random traces and configurations,
+    printing each run where they differ, and return the number of such
+    runs.
+
+    @type runs: int
+    @type seed: int
+    @rtype: int
+    """
+    rng = random.Random(seed)
+    handle, path = tempfile.mkstemp(suffix='.txt')
+    os.close(handle)
+    mismatches = 0
+    try:
+        for run in range(runs):
+            config = _random_config(rng)
+            write_events(path, rng.randint(1, 3000),
+                         arrival_rate=rng.choice([0.05, 0.2, 0.5, 2]),
+                         items=rng.choice(['uniform', 'geometric']),
+                         mean_items=rng.choice([3, 15, 100]),
+                         close_rate=rng.choice([0, 0.001, 0.02]),
+                         lines=len(GroceryStore(config).lines), min_open=1,
+                         seed=run)
+            for trace_checkouts in (False, True):
+                differences = compare_engines(config, path, trace_checkouts)
+                if differences:
+                    mismatches += 1
+                    print(run, config, trace_checkouts, differences)
+    finally:
+        os.remove(path)
+    print('{} of {} runs differ'.format(mismatches, 2 * runs))
+    return mismatches
+
+
+if __name__ == '__main__':
+    sys.exit(1 if main() else 0)
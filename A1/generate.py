@@ -0,0 +1,167 @@
+"""Assignment 1 - Synthetic Inputs
+
+This file generates event files and matching store configurations for the
+grocery store simulation, to test and benchmark it on inputs far larger
+than the handout's examples.
+
+Arrivals follow a Poisson process: the time between two arrivals is
+exponentially distributed, rounded down to whole time units. The number of
+items a costumer carries is drawn from one of ITEM_DISTRIBUTIONS. Lines
+close at random, but never so many that fewer than <min_open> remain open.
+
+It can also be run as a script, e.g.
+
+    python generate.py events.txt 1000000 --config config.json \
+        --arrival_rate 0.3 --close_rate 0.001
+
+which writes a million events to events.txt and the store they were
+generated for to config.json.
+"""
+import argparse
+import json
+import math
+import random
+
+# The distributions the number of items of a costumer can be drawn from.
+ITEM_DISTRIBUTIONS = ('uniform', 'geometric')
+
+
+def store_config(cashiers=6, express=2, self_serve=2, capacity=1000):
+    """Return the configuration of a store with the given number of lines of
+    each type, each of which holds at most <capacity> costumers.
+
+    >>> store_config(1, 0, 0, 5) == {'cashier_count': 1, 'express_count': 0,
+    ...                              'self_serve_count': 0, 'line_capacity': 5}
+    True
+
+    @type cashiers: int
+    @type express: int
+    @type self_serve: int
+    @type capacity: int
+    @rtype: dict[str, int]
+    """
+    return {'cashier_count': cashiers,
+            'express_count': express,
+            'self_serve_count': self_serve,
+            'line_capacity': capacity}
+
+
+def write_config(filename, config):
+    """Write the store configuration <config> to <filename>.
+
+    @type filename: str
+    @type config: dict[str, object]
+    @rtype: None
+    """
+    with open(filename, 'w') as file:
+        json.dump(config, file, indent=2)
+
+
+def generate_events(n, arrival_rate=0.3, items='uniform', mean_items=15,
+                    close_rate=0.0, lines=10, min_open=2, seed=0):
+    """Yield <n> random events, as lines of an event file.
+
+    >>> events = list(generate_events(1000, close_rate=0.1, lines=4))
+    >>> len(events)
+    1000
+    >>> sum(1 for event in events if ' Close ' in event)
+    2
+    >>> times = [int(event.split()[0]) for event in events]
+    >>> times == sorted(times)
+    True
+
+    @type n: int
+    @type arrival_rate: float
+        The mean number of costumers arriving per time unit.
+    @type items: str
+        The distribution of the number of items, one of
+        ITEM_DISTRIBUTIONS: 'uniform' draws from 1 to 2 * mean_items - 1,
+        'geometric' has many small baskets and a few large ones.
+    @type mean_items: int
+        The mean number of items of a costumer.
+    @type close_rate: float
+        The probability that an event closes a line.
+    @type lines: int
+        The number of lines of the store.
+    @type min_open: int
+        The number of lines which never close.
+    @type seed: int
+    @rtype: iterator[str]
+    """
+    if items not in ITEM_DISTRIBUTIONS:
+        raise ValueError('unknown item distribution {}'.format(items))
+    rng = random.Random(seed)
+    open_lines = list(range(lines))
+    # The probability of stopping at each item of a geometric basket.
+    stop = 1 / mean_items
+    timestamp = 0
+    for i in range(n):
+        timestamp += int(rng.expovariate(arrival_rate))
+        if len(open_lines) > min_open and rng.random() < close_rate:
+            line = open_lines.pop(rng.randrange(len(open_lines)))
+            yield '{} Close {}\n'.format(timestamp, line)
+        else:
+            if items == 'uniform':
+                count = rng.randint(1, 2 * mean_items - 1)
+            elif stop < 1:
+                count = 1 + int(math.log(1 - rng.random()) /
+                                math.log(1 - stop))
+            else:
+                count = 1
+            yield '{} Arrive Costumer{} {}\n'.format(timestamp, i, count)
+
+
+def write_events(filename, n, **options):
+    """Write <n> random events to <filename>.
+
+    <options> are passed on to generate_events.
+
+    @type filename: str
+    @type n: int
+    @rtype: None
+    """
+    with open(filename, 'w') as file:
+        file.writelines(generate_events(n, **options))
+
+
+def main(argv=None):
+    """Generate an event file, and optionally a store configuration, from
+    the command line arguments <argv>.
+
+    @type argv: list[str] | None
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Generate a random event file for the simulation.')
+    parser.add_argument('event_file')
+    parser.add_argument('n', type=int, help='the number of events')
+    parser.add_argument('--config', metavar='FILE',
+                        help='also write the store configuration to FILE')
+    parser.add_argument('--arrival_rate', type=float, default=0.3)
+    parser.add_argument('--items', choices=ITEM_DISTRIBUTIONS,
+                        default='uniform')
+    parser.add_argument('--mean_items', type=int, default=15)
+    parser.add_argument('--close_rate', type=float, default=0.0)
+    parser.add_argument('--min_open', type=int, default=2)
+    parser.add_argument('--cashiers', type=int, default=6)
+    parser.add_argument('--express', type=int, default=2)
+    parser.add_argument('--self_serve', type=int, default=2)
+    parser.add_argument('--capacity', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    write_events(args.event_file, args.n,
+                 arrival_rate=args.arrival_rate,
+                 items=args.items,
+                 mean_items=args.mean_items,
+                 close_rate=args.close_rate,
+                 lines=args.cashiers + args.express + args.self_serve,
+                 min_open=args.min_open,
+                 seed=args.seed)
+    if args.config is not None:
+        write_config(args.config, store_config(
+            args.cashiers, args.express, args.self_serve, args.capacity))
+
+
+if __name__ == '__main__':
+    main()
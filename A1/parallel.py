@@ -0,0 +1,296 @@
+"""Assignment 1 - Parallel Simulation (experimental)
+
+This file contains an optimistic parallel engine for traces of arrivals
+only, i.e. with no closing lines.
+
+Without closures, the state of the store just before an arrival is the
+finish time of every costumer in each line, and an arrival at time t only
+depends on that state: costumers who finish before t leave their lines,
+and the new costumer joins the shortest line they may join (the lowest id
+on a tie), finishing at max(t, f) + s, where f is the finish time of the
+costumer ahead of them and s is their checkout time.
+
+The costumers choosing their line couple every line at every arrival, so
+the lines cannot be simulated apart. The trace is cut in time instead: it
+is split into one window of consecutive arrivals per worker, and every
+window is simulated at once, each worker guessing that the store is empty
+when its window starts. Workers save the state of the store every
+SNAPSHOT_EVERY arrivals. The windows are then checked in order: if the
+true state at the start of a window differs from the guess, the window is
+rolled back and simulated again from the true state, one snapshot
+interval at a time, until the state matches the saved snapshot. From
+there on the speculative results were right, and are kept. Lines which
+empty out forget where they started, so under moderate load only a short
+prefix of each window is simulated twice.
+
+Like batch.py, the engine reports the 'num_customers', 'total_time' and
+'max_wait' statistics of GroceryStoreSimulation.run. Traces with
+closures, stores with a single line and stores with random checkout times
+are handed to GroceryStoreSimulation.
+
+Run this file directly to benchmark it (see bench_speedup).
+"""
+import os
+import sys
+from collections import deque
+from multiprocessing import Pool
+from timeit import default_timer
+from simulation import GroceryStoreSimulation
+from store import GroceryStore
+from traces import CLOSE, as_trace
+
+# The number of arrivals between two saved states of the store.
+SNAPSHOT_EVERY = 1000
+
+# The arrival times, number of items, and line description of the trace and
+# store being simulated, in a worker process.
+_timestamps = None
+_items = None
+_store = None
+
+
+def simulate_parallel(config, event_file, workers=None):
+    """Simulate the store of <config> on the events of <event_file> using
+    <workers> worker processes.
+
+    Return a dictionary with the 'num_customers', 'total_time' and
+    'max_wait' statistics that GroceryStoreSimulation.run would report.
+    Raise IndexError, as run would, if some costumer cannot join any line.
+
+    @type config: dict[str, object] | str
+    @type event_file: str | Trace
+        A text event file, a binary trace file or a Trace.
+    @type workers: int | None
+        The number of worker processes; the number of CPUs if None.
+    @rtype: dict[str, object]
+    """
+    trace = as_trace(event_file)
+    store = GroceryStore(config)
+    if len(store.lines) < 2 or CLOSE in trace.kinds or \
+            any(line.distribution is not None for line in store.lines):
+        stats = GroceryStoreSimulation(config).run(trace, engine='fast')
+        return {'num_customers': stats['num_customers'],
+                'total_time': stats['total_time'],
+                'max_wait': stats['max_wait']}
+    if workers is None:
+        workers = os.cpu_count() or 1
+    timestamps = list(trace.timestamps)
+    items = list(trace.values)
+    description = _describe(store, max(items, default=0))
+    count = len(timestamps)
+    bounds = [count * k // workers for k in range(workers + 1)]
+    windows = [(bounds[k], bounds[k + 1]) for k in range(workers)
+               if bounds[k] < bounds[k + 1]]
+
+    _setup(timestamps, items, description)
+    if len(windows) > 1:
+        with Pool(len(windows), initializer=_setup,
+                  initargs=(timestamps, items, description)) as pool:
+            guesses = pool.starmap(_speculate, windows)
+    else:
+        guesses = [_speculate(start, stop) for start, stop in windows]
+
+    state = _empty_state(description)
+    max_wait = -1
+    total_time = 0
+    for (start, stop), guess in zip(windows, guesses):
+        snapshots, segments, end_state = guess
+        position = start
+        # Roll back until the true state matches a saved one.
+        while position < stop and \
+                _normalize(state, timestamps[position]) != \
+                snapshots[(position - start) // SNAPSHOT_EVERY]:
+            end = min(position + SNAPSHOT_EVERY, stop)
+            state, segment = _simulate_window(state, position, end)
+            if segment[0] is not None:
+                _fail(trace, segment[0])
+            max_wait = max(max_wait, segment[1])
+            total_time = max(total_time, segment[2])
+            position = end
+        if position < stop:
+            for segment in segments[(position - start) // SNAPSHOT_EVERY:]:
+                if segment[0] is not None:
+                    _fail(trace, segment[0])
+                max_wait = max(max_wait, segment[1])
+                total_time = max(total_time, segment[2])
+            state = end_state
+    return {'num_customers': count, 'total_time': total_time,
+            'max_wait': max_wait}
+
+
+def _describe(store, most_items):
+    """Return the description of <store> the engine works from: the item
+    limit of each line, its checkout time for 0 to <most_items> items, its
+    capacity and whether it has a single line.
+
+    @type store: GroceryStore
+    @type most_items: int
+    @rtype: (list[int | None], list[list[int]], int, bool)
+    """
+    limits = [line.item_limit for line in store.lines]
+    times = [[line.time_to_checkout(n) for n in range(most_items + 1)]
+             for line in store.lines]
+    return limits, times, store._lines_capacity, len(store.lines) == 1
+
+
+def _setup(timestamps, items, description):
+    """Make the trace of <timestamps> and <items>, and the store
+    <description>, the ones simulated by this process.
+
+    @type timestamps: list[int]
+    @type items: list[int]
+    @type description: (list[int | None], list[list[int]], int, bool)
+    @rtype: None
+    """
+    global _timestamps, _items, _store
+    _timestamps = timestamps
+    _items = items
+    _store = description
+
+
+def _empty_state(description):
+    """Return the state of the store of <description> with no costumers.
+
+    @type description: (list[int | None], list[list[int]], int, bool)
+    @rtype: tuple[tuple[int]]
+    """
+    return tuple(() for _ in description[0])
+
+
+def _normalize(state, timestamp):
+    """Return <state> without the costumers who finished before
+    <timestamp>.
+
+    @type state: tuple[tuple[int]]
+    @type timestamp: int
+    @rtype: tuple[tuple[int]]
+    """
+    return tuple(tuple(finish for finish in line if finish >= timestamp)
+                 for line in state)
+
+
+def _speculate(start, stop):
+    """Simulate the arrivals <start> to <stop> from an empty store.
+
+    Return the state of the store before every SNAPSHOT_EVERY-th arrival,
+    the statistics of the arrivals between two snapshots (see
+    _simulate_window) and the state after the last arrival.
+
+    @type start: int
+    @type stop: int
+    @rtype: (list[tuple[tuple[int]]], list[(int | None, int, int)],
+             tuple[tuple[int]])
+    """
+    state = _empty_state(_store)
+    snapshots = []
+    segments = []
+    for position in range(start, stop, SNAPSHOT_EVERY):
+        snapshots.append(_normalize(state, _timestamps[position]))
+        state, segment = _simulate_window(
+            state, position, min(position + SNAPSHOT_EVERY, stop))
+        segments.append(segment)
+    return snapshots, segments, state
+
+
+def _simulate_window(state, start, stop):
+    """Simulate the arrivals <start> to <stop> from the store state <state>.
+
+    Return the state after the last arrival, and the statistics of the
+    window: the index of the first costumer who could not join a line (or
+    None), the longest wait and the latest finish time.
+
+    @type state: tuple[tuple[int]]
+    @type start: int
+    @type stop: int
+    @rtype: (tuple[tuple[int]], (int | None, int, int))
+    """
+    limits, times, capacity, single = _store
+    timestamps = _timestamps
+    items = _items
+    queues = [deque(line) for line in state]
+    lines = range(len(queues))
+    max_wait = -1
+    total_time = 0
+    for i in range(start, stop):
+        t = timestamps[i]
+        n = items[i]
+        chosen = None
+        shortest = 0
+        for line in lines:
+            queue = queues[line]
+            while queue and queue[0] < t:
+                queue.popleft()
+            if (chosen is None or len(queue) < shortest) and \
+                    (single or limits[line] is None or n <= limits[line]):
+                chosen = line
+                shortest = len(queue)
+        if chosen is None or not (single or shortest < capacity):
+            return tuple(tuple(queue) for queue in queues), \
+                (i, max_wait, total_time)
+        queue = queues[chosen]
+        finish = (queue[-1] if queue else t) + times[chosen][n]
+        queue.append(finish)
+        if finish - t > max_wait:
+            max_wait = finish - t
+        if finish > total_time:
+            total_time = finish
+    return tuple(tuple(queue) for queue in queues), \
+        (None, max_wait, total_time)
+
+
+def _fail(trace, position):
+    """Raise the IndexError of the costumer of arrival <position> of
+    <trace>, who cannot join any line.
+
+    @type trace: Trace
+    @type position: int
+    @rtype: None
+    """
+    raise IndexError('no checkout line can take costumer {}'.format(
+        trace.ids[trace.costumers[position]]))
+
+
+def bench_speedup(config, event_file, workers=(1, 2, 4, 8)):
+    """Compare the seconds taken by the parallel engine with each number of
+    worker processes in <workers>, and by the serial fast engine.
+
+    With one worker, the parallel engine simulates the whole trace in this
+    process, with no speculation; it is the serial baseline of the speedup.
+    The fast engine also collects every wait statistic, so its time is
+    given for reference only.
+
+    Return a dictionary with the seconds of each engine, and the speedup of
+    each number of workers over one worker.
+
+    @type config: dict[str, object] | str
+    @type event_file: str | Trace
+    @type workers: iterable[int]
+    @rtype: dict[str, object]
+    """
+    trace = as_trace(event_file)
+    start = default_timer()
+    expected = GroceryStoreSimulation(config).run(trace, engine='fast')
+    results = {'fast_engine_seconds': default_timer() - start}
+    for count in [1] + [count for count in workers if count != 1]:
+        start = default_timer()
+        stats = simulate_parallel(config, trace, count)
+        seconds = default_timer() - start
+        assert all(stats[key] == expected[key] for key in stats), \
+            'the parallel engine disagrees with the serial one'
+        results['{}_workers_seconds'.format(count)] = seconds
+        results['{}_workers_speedup'.format(count)] = \
+            results['1_workers_seconds'] / seconds
+    return results
+
+
+if __name__ == '__main__':
+    from generate import store_config, write_events
+    path = sys.argv[1] if len(sys.argv) > 1 else 'parallel_bench.txt'
+    if len(sys.argv) <= 1:
+        write_events(path, 1000000, arrival_rate=0.25)
+    try:
+        print(os.cpu_count(), 'CPUs')
+        print(bench_speedup(store_config(), path))
+    finally:
+        if len(sys.argv) <= 1:
+            os.remove(path)
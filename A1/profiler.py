@@ -0,0 +1,249 @@
+"""Assignment 1 - Simulation Profiling
+
+This file contains an opt-in profiler for the grocery store simulation.
+Pass a SimulationProfiler to GroceryStoreSimulation to count and time the
+events of each type, the operations on the event queue and the line
+assignments, and to sample the depth of the event queue as the simulation
+runs. Without a profiler, the simulation does none of this work.
+"""
+import json
+from timeit import default_timer
+from container import Container
+
+
+class SimulationProfiler:
+    """A collector of counters and timings for one simulation run.
+
+    === Attributes ===
+    @type event_counts: dict[str, int]
+        The number of events performed, by event class name.
+    @type event_seconds: dict[str, float]
+        The seconds spent performing events, by event class name.
+    @type queue_counts: dict[str, int]
+        The number of 'add' and 'remove' operations on the event queue.
+    @type queue_seconds: dict[str, float]
+        The seconds spent in 'add' and 'remove' operations.
+    @type assign_count: int
+        The number of calls to GroceryStore.assign_to_line.
+    @type assign_seconds: float
+        The seconds spent in GroceryStore.assign_to_line.
+    @type max_depth: int
+        The largest number of events the queue held.
+    @type sample_every: int
+        The number of events performed between two samples of the time
+        series.
+    @type series: list[dict[str, object]] | None
+        The samples taken so far, or None if no time series is kept.
+    """
+    # === Private Attributes ===
+    # @type _depth: int
+    #     The number of events in the queue.
+    # @type _performed: int
+    #     The number of events performed.
+    # @type _started: float | None
+    #     The time the first event was performed.
+
+    def __init__(self, sample_every=1000, keep_series=False):
+        """Initialize an empty SimulationProfiler.
+
+        @type self: SimulationProfiler
+        @type sample_every: int
+        @type keep_series: bool
+            Whether to keep a time series of samples.
+        @rtype: None
+        """
+        self.event_counts = {}
+        self.event_seconds = {}
+        self.queue_counts = {'add': 0, 'remove': 0}
+        self.queue_seconds = {'add': 0.0, 'remove': 0.0}
+        self.assign_count = 0
+        self.assign_seconds = 0.0
+        self.max_depth = 0
+        self.sample_every = sample_every
+        self.series = [] if keep_series else None
+        self._depth = 0
+        self._performed = 0
+        self._started = None
+
+    def watch(self, queue, store):
+        """Start profiling the event queue <queue> and the line assignments
+        of <store>.
+
+        Return the queue to use in place of <queue>.
+
+        @type self: SimulationProfiler
+        @type queue: Container
+        @type store: GroceryStore
+        @rtype: Container
+        """
+        store.assign_to_line = _TimedAssignment(store.assign_to_line, self)
+        return _ProfiledQueue(queue, self)
+
+    def perform(self, event, store):
+        """Perform <event> on <store>, and return the events it spawned.
+
+        @type self: SimulationProfiler
+        @type event: Event
+        @type store: GroceryStore
+        @rtype: list[Event]
+        """
+        start = default_timer()
+        if self._started is None:
+            self._started = start
+        new_events = event.do(store)
+        elapsed = default_timer() - start
+        name = type(event).__name__
+        self.event_counts[name] = self.event_counts.get(name, 0) + 1
+        self.event_seconds[name] = self.event_seconds.get(name, 0.0) + elapsed
+        self._performed += 1
+        if self.series is not None and \
+                self._performed % self.sample_every == 0:
+            self.series.append({'events': self._performed,
+                                'timestamp': event.timestamp,
+                                'queue_depth': self._depth,
+                                'seconds': default_timer() - self._started})
+        return new_events
+
+    def summary(self):
+        """Return a dictionary summarizing the counters and timings.
+
+        @type self: SimulationProfiler
+        @rtype: dict[str, object]
+        """
+        events = {}
+        for name in sorted(self.event_counts):
+            count = self.event_counts[name]
+            events[name] = {'count': count,
+                            'seconds': self.event_seconds[name],
+                            'mean_seconds': self.event_seconds[name] / count}
+        queue = {}
+        for operation in ('add', 'remove'):
+            count = self.queue_counts[operation]
+            queue[operation] = {
+                'count': count,
+                'seconds': self.queue_seconds[operation],
+                'mean_seconds':
+                    self.queue_seconds[operation] / count if count else None}
+        return {'events': events,
+                'queue': queue,
+                'max_queue_depth': self.max_depth,
+                'assign_to_line': {
+                    'count': self.assign_count,
+                    'seconds': self.assign_seconds,
+                    'mean_seconds': self.assign_seconds / self.assign_count
+                    if self.assign_count else None}}
+
+    def export(self, filename):
+        """Write the summary, and the time series if kept, to <filename> as
+        JSON.
+
+        @type self: SimulationProfiler
+        @type filename: str
+        @rtype: None
+        """
+        with open(filename, 'w') as file:
+            json.dump({'summary': self.summary(), 'series': self.series},
+                      file, indent=2)
+
+
+class _ProfiledQueue(Container):
+    """A Container which times the operations of another Container and
+    tracks its depth.
+    """
+    # === Private Attributes ===
+    # @type _queue: Container
+    #     The container being profiled.
+    # @type _profiler: SimulationProfiler
+    #     The profiler recording the operations.
+
+    def __init__(self, queue, profiler):
+        """Initialize a _ProfiledQueue around <queue>.
+
+        @type self: _ProfiledQueue
+        @type queue: Container
+        @type profiler: SimulationProfiler
+        @rtype: None
+        """
+        self._queue = queue
+        self._profiler = profiler
+
+    def add(self, item):
+        """Add <item> to the container being profiled.
+
+        @type self: _ProfiledQueue
+        @type item: object
+        @rtype: None
+        """
+        profiler = self._profiler
+        start = default_timer()
+        self._queue.add(item)
+        profiler.queue_seconds['add'] += default_timer() - start
+        profiler.queue_counts['add'] += 1
+        profiler._depth += 1
+        if profiler._depth > profiler.max_depth:
+            profiler.max_depth = profiler._depth
+
+    def remove(self):
+        """Remove and return the next item of the container being profiled.
+
+        @type self: _ProfiledQueue
+        @rtype: object
+        """
+        profiler = self._profiler
+        start = default_timer()
+        item = self._queue.remove()
+        profiler.queue_seconds['remove'] += default_timer() - start
+        profiler.queue_counts['remove'] += 1
+        profiler._depth -= 1
+        return item
+
+    def peek(self):
+        """Return the next item of the container being profiled.
+
+        @type self: _ProfiledQueue
+        @rtype: object
+        """
+        return self._queue.peek()
+
+    def is_empty(self):
+        """Return True iff the container being profiled is empty.
+
+        @type self: _ProfiledQueue
+        @rtype: bool
+        """
+        return self._queue.is_empty()
+
+
+class _TimedAssignment:
+    """A replacement for the assign_to_line method of a store, which times
+    each call.
+    """
+    # === Private Attributes ===
+    # @type _assign: (Costumer) -> CheckoutLine
+    #     The store's own assign_to_line method.
+    # @type _profiler: SimulationProfiler
+    #     The profiler recording the calls.
+
+    def __init__(self, assign, profiler):
+        """Initialize a _TimedAssignment of the bound method <assign>.
+
+        @type self: _TimedAssignment
+        @type assign: (Costumer) -> CheckoutLine
+        @type profiler: SimulationProfiler
+        @rtype: None
+        """
+        self._assign = assign
+        self._profiler = profiler
+
+    def __call__(self, costumer):
+        """Return the line <costumer> should join.
+
+        @type self: _TimedAssignment
+        @type costumer: Costumer
+        @rtype: CheckoutLine
+        """
+        start = default_timer()
+        line = self._assign(costumer)
+        self._profiler.assign_seconds += default_timer() - start
+        self._profiler.assign_count += 1
+        return line
@@ -0,0 +1,248 @@
+"""Assignment 1 - Monte Carlo Replication
+
+This file runs many replicas of a simulation whose store has random
+checkout times (see DeclaredLine), each with its own seed, and reports
+confidence intervals on the statistics of a run.
+
+The trace is parsed once and placed in shared memory (see shared_trace),
+where every worker process reads it. Replicas are run in parallel, but
+their results are taken in seed order, so the same arguments always give
+the same replicas and intervals. Once every statistic given a target
+half-width has a confidence interval at least that narrow, the remaining
+replicas are cancelled.
+
+It can also be run as a script, e.g.
+
+    python replicate.py config.json events.txt --replicas 200 \
+        --half_width max_wait=5 --half_width p95=2
+
+which prints the intervals as JSON.
+"""
+import argparse
+import json
+from math import sqrt, pi, cos, sin, expm1
+from multiprocessing import Pool
+from statistics import NormalDist, mean, stdev
+from simulation import GroceryStoreSimulation
+from traces import shared_trace, attach_shared_trace
+
+# The statistics of a replica which intervals are computed for.
+STATISTICS = ('max_wait', 'total_time', 'mean_wait', 'p50', 'p95', 'p99')
+
+# The configuration simulated, and the trace it is simulated on, in a
+# worker process.
+_config = None
+_trace = None
+
+
+def t_quantile(confidence, df):
+    """Return the critical value of Student's t distribution with <df>
+    degrees of freedom for a two-sided interval of level <confidence>.
+
+    This is Hill's algorithm (Algorithm 396, CACM 1970).
+
+    >>> round(t_quantile(0.95, 4), 3), round(t_quantile(0.99, 10), 3)
+    (2.776, 3.169)
+
+    @type confidence: float
+    @type df: int
+    @rtype: float
+    """
+    p = 1 - confidence
+    if df == 1:
+        p *= pi / 2
+        return cos(p) / sin(p)
+    if df == 2:
+        return sqrt(2 / (p * (2 - p)) - 2)
+    a = 1 / (df - 0.5)
+    b = 48 / (a * a)
+    c = ((20700 * a / b - 98) * a - 16) * a + 96.36
+    d = ((94.5 / (b + c) - 3) / b + 1) * sqrt(a * pi / 2) * df
+    x = d * p
+    y = x ** (2 / df)
+    if y > 0.05 + a:
+        x = NormalDist().inv_cdf(p / 2)
+        y = x * x
+        if df < 5:
+            c += 0.3 * (df - 4.5) * (x + 0.6)
+        c = (((0.05 * d * x - 5) * x - 7) * x - 2) * x + b + c
+        y = (((((0.4 * y + 6.3) * y + 36) * y + 94.5) / c - y - 3) / b +
+             1) * x
+        y = expm1(a * y * y)
+    else:
+        y = ((1 / (((df + 6) / (df * y) - 0.089 * d - 0.822) *
+                   (df + 2) * 3) + 0.5 / (df + 4)) * y - 1) * \
+            (df + 1) / (df + 2) + 1 / y
+    return sqrt(df * y)
+
+
+def interval(values, confidence=0.95):
+    """Return the mean of <values> and the half-width of its t-based
+    confidence interval of level <confidence>.
+
+    The half-width is None for fewer than two values.
+
+    >>> centre, half_width = interval([1, 2, 3])
+    >>> centre, round(half_width, 3)
+    (2, 2.484)
+
+    @type values: list[int | float]
+    @type confidence: float
+    @rtype: (float, float | None)
+    """
+    if len(values) < 2:
+        return mean(values), None
+    return mean(values), t_quantile(confidence, len(values) - 1) * \
+        stdev(values) / sqrt(len(values))
+
+
+def _attach(config, name):
+    """Attach this worker process to the trace in shared memory <name>, to
+    simulate <config> on it.
+
+    @type config: dict[str, object] | str
+    @type name: str
+    @rtype: None
+    """
+    global _config, _trace
+    _config = config
+    _trace = attach_shared_trace(name)
+
+
+def _replica(seed):
+    """Return the statistics of the replica of _config with seed <seed>, or
+    None if some costumer could not join any line.
+
+    @type seed: int
+    @rtype: dict[str, int | float] | None
+    """
+    try:
+        stats = GroceryStoreSimulation(_config, seed=seed).run(
+            _trace, engine='fast')
+    except IndexError:
+        return None
+    wait_stats = stats['wait_stats']
+    return {'max_wait': stats['max_wait'],
+            'total_time': stats['total_time'],
+            'mean_wait': wait_stats['mean'],
+            'p50': wait_stats['p50'],
+            'p95': wait_stats['p95'],
+            'p99': wait_stats['p99']}
+
+
+def replicate(config, event_file, replicas=100, half_widths=None,
+              confidence=0.95, min_replicas=10, seed=0, processes=None):
+    """Simulate up to <replicas> replicas of <config> on <event_file>, with
+    seeds <seed>, <seed> + 1, ..., and return confidence intervals on their
+    statistics.
+
+    The result has the number of 'replicas' run, the number which
+    'failed' because some costumer could not join any line, whether the
+    targets were 'reached', and the 'intervals': the 'mean', 'half_width'
+    and ('low', 'high') 'interval' of each of STATISTICS over the replicas
+    which did not fail.
+
+    @type config: dict[str, object] | str
+    @type event_file: str | Trace
+        A text event file, a binary trace file or a Trace.
+    @type replicas: int
+        The most replicas to run.
+    @type half_widths: dict[str, float] | None
+        The target half-width of the interval of some of STATISTICS. No
+        more replicas are run once every target is met, after at least
+        <min_replicas>. If None, all <replicas> are run.
+    @type confidence: float
+    @type min_replicas: int
+    @type seed: int
+    @type processes: int | None
+        The number of worker processes; the number of CPUs if None.
+    @rtype: dict[str, object]
+    """
+    if half_widths is None:
+        half_widths = {}
+    unknown = set(half_widths) - set(STATISTICS)
+    if unknown:
+        raise ValueError('unknown statistics {}'.format(sorted(unknown)))
+    results = []
+    runs = 0
+    reached = False
+    with shared_trace(event_file) as name, \
+            Pool(processes, initializer=_attach,
+                 initargs=(config, name)) as pool:
+        for result in pool.imap(_replica, range(seed, seed + replicas)):
+            runs += 1
+            if result is not None:
+                results.append(result)
+            if half_widths and runs >= min_replicas and \
+                    _targets_met(results, half_widths, confidence):
+                # Leaving the with block cancels the other replicas.
+                reached = True
+                break
+
+    intervals = {}
+    for name in STATISTICS:
+        values = [result[name] for result in results
+                  if result[name] is not None]
+        if not values:
+            intervals[name] = None
+            continue
+        centre, half_width = interval(values, confidence)
+        intervals[name] = {
+            'mean': centre,
+            'half_width': half_width,
+            'interval': None if half_width is None else
+            (centre - half_width, centre + half_width)}
+    return {'replicas': runs, 'failed': runs - len(results),
+            'reached': reached, 'intervals': intervals}
+
+
+def _targets_met(results, half_widths, confidence):
+    """Return True iff the confidence interval of each statistic of
+    <half_widths> over <results> is at most its target half-width.
+
+    @type results: list[dict[str, int | float]]
+    @type half_widths: dict[str, float]
+    @type confidence: float
+    @rtype: bool
+    """
+    for name, target in half_widths.items():
+        values = [result[name] for result in results
+                  if result[name] is not None]
+        half_width = interval(values, confidence)[1] if values else None
+        if half_width is None or half_width > target:
+            return False
+    return True
+
+
+def main(argv=None):
+    """Run the replicas of the command line arguments <argv>.
+
+    @type argv: list[str] | None
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Replicate a simulation with random checkout times.')
+    parser.add_argument('config_file')
+    parser.add_argument('event_file')
+    parser.add_argument('--replicas', type=int, default=100)
+    parser.add_argument('--half_width', action='append', default=[],
+                        metavar='STATISTIC=WIDTH',
+                        help='stop once this interval is narrow enough')
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument('--min_replicas', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    half_widths = {}
+    for target in args.half_width:
+        name, width = target.split('=')
+        half_widths[name] = float(width)
+    print(json.dumps(replicate(args.config_file, args.event_file,
+                               args.replicas, half_widths, args.confidence,
+                               args.min_replicas, args.seed,
+                               args.processes), indent=2))
+
+
+if __name__ == '__main__':
+    main()
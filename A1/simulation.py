@@ -2,11 +2,26 @@
 
 This file should contain all of the classes necessary to model the different
 kinds of events in the simulation.
-"""
 
-from container import PriorityQueue
-from store import GroceryStore
-from event import JoinLine, FinishCheckingOut, create_event_list
+A long simulation can save its state to a checkpoint file every so many
+events, and be resumed from the latest checkpoint with load_checkpoint and
+GroceryStoreSimulation.resume. Checkpoints are written by a forked child
+process where the platform supports it, so the simulation itself only
+pauses for the fork.
+"""
+import os
+import pickle
+import sys
+import traceback
+import warnings
+import zlib
+from operator import attrgetter
+from container import PriorityQueue, CalendarQueue
+from store import GroceryStore, CostumerRegistry
+from event import JoinLine, FinishCheckingOut, CloseLine
+from traces import open_events
+from fast import simulate_fast
+from stats import WaitStats
 
 
 class GroceryStoreSimulation:
@@ -16,69 +31,423 @@ class GroceryStoreSimulation:
     simulation.
     """
     # === Private Attributes ===
-    # @type _events: PriorityQueue[Event]
+    # @type _events: PriorityQueue[Event] | CalendarQueue[Event]
     #     A sequence of events arranged in priority determined by the event
     #     sorting order.
     # @type _store: GroceryStore
     #     The grocery store associated with the simulation.
+    # @type _collector: StatsCollector
+    #     The collector of the costumers' wait times.
+    # @type _incoming: iterator[Event] | None
+    #     The events of the event file which have not been read yet.
+    # @type _pending: Event | None
+    #     The event read last from the event file, if it has not been
+    #     performed yet.
+    # @type _consumed: int
+    #     The number of events read from the event file.
+    # @type _total_time: int
+    #     The timestamp of the last event performed.
+    # @type _checkpoint_pid: int | None
+    #     The process id of the child writing a checkpoint, if any.
+    # @type _profiler: SimulationProfiler | None
+    #     The profiler of this simulation, if any.
+    # @type _bulk_close: bool
+    #     Whether the costumers displaced by a closing line rejoin lines
+    #     without going through the event queue when possible.
 
-    def __init__(self, store_file):
+    def __init__(self, store_file, collector=None, trace_checkouts=False,
+                 queue='heap', profiler=None, bulk_close=True,
+                 costumer_file=None, seed=None):
         """Initialize a GroceryStoreSimulation from a file.
 
-        @type store_file: str
-            A file containing the configuration of the grocery store.
+        @type store_file: str | dict[str, object]
+            A file containing the configuration of the grocery store, or the
+            configuration itself.
+        @type collector: StatsCollector | None
+            The collector of the costumers' wait times. If None, a WaitStats
+            is used.
+        @type trace_checkouts: bool
+            Whether to perform a CheckingOut event each time a costumer
+            starts to checkout, as well as the FinishCheckingOut event.
+        @type queue: str
+            The kind of event queue: 'heap' for a PriorityQueue, or
+            'calendar' for a CalendarQueue. The calendar queue fits its
+            buckets to the spacing of the events, but only beats the heap
+            when timestamps are dense (see bench_calendar_queue).
+        @type profiler: SimulationProfiler | None
+            A profiler to count and time the events performed, or None not
+            to profile the simulation.
+        @type bulk_close: bool
+            Whether a closing line reassigns its costumers in one pass (see
+            CloseLine.do_in_bulk) instead of queueing a JoinLine event for
+            each of them. The results are the same either way. Ignored
+            with a profiler, which counts and times each JoinLine event.
+        @type costumer_file: str | None
+            A file to write the record of each costumer to when they finish
+            checking out (see CostumerRegistry), or None not to keep them.
+        @type seed: int | None
+            The seed of the store's random checkout times, or None to use
+            the one of the configuration.
         @rtype: None
         """
-        self._events = PriorityQueue()
+        if queue == 'heap':
+            self._events = PriorityQueue(key=attrgetter('timestamp'))
+        elif queue == 'calendar':
+            self._events = CalendarQueue(key=attrgetter('timestamp'))
+        else:
+            raise ValueError('unknown kind of queue {}'.format(queue))
         self._store = GroceryStore(store_file)
+        self._store.trace_checkouts = trace_checkouts
+        self._store.costumers = CostumerRegistry(costumer_file)
+        if seed is not None:
+            self._store.rng.seed(seed)
+        if collector is None:
+            collector = WaitStats()
+        self._collector = collector
+        self._incoming = None
+        self._pending = None
+        self._consumed = 0
+        self._total_time = 0
+        self._checkpoint_pid = None
+        self._profiler = profiler
+        self._bulk_close = bulk_close
+        if profiler is not None:
+            self._events = profiler.watch(self._events, self._store)
+
+    def __getstate__(self):
+        """Return the state of this simulation to pickle.
+
+        The event file iterator and checkpoint process are left out; the
+        number of events read from the event file is enough to reopen it.
+
+        @type self: GroceryStoreSimulation
+        @rtype: dict[str, object]
+        """
+        state = dict(self.__dict__)
+        state['_incoming'] = None
+        state['_checkpoint_pid'] = None
+        return state
 
-    def run(self, event_file):
+    def run(self, event_file, checkpoint_file=None,
+            checkpoint_every=1000000, engine='object'):
         """Run the simulation on the events stored in <event_file>.
 
         Return a dictionary containing statistics of the simulation,
-        according to the specifications in the assignment handout.
+        according to the specifications in the assignment handout. The
+        summary of the wait time collector is added under 'wait_stats'.
 
         @type self: GroceryStoreSimulation
-        @type event_file: str
-            A filename referring to a raw list of events.
-            Precondition: the event file is a valid list of events.
+        @type event_file: str | Trace
+            A filename referring to a raw list of events or to a binary
+            trace file (see traces.py), or an already loaded Trace.
+            Precondition: the event file is a valid list of events, sorted
+            by timestamp.
+        @type checkpoint_file: str | None
+            The file to save the state of the simulation to, or None not to
+            save it.
+        @type checkpoint_every: int
+            The number of events performed between two checkpoints.
+        @type engine: str
+            'object' to perform Event objects, or 'fast' for the engine of
+            fast.py, which gives the same statistics but cannot be
+            checkpointed, profiled or write a costumer file.
         @rtype: dict[str, object]
         """
-        stats = {
-            'num_customers': 0,
-            'total_time': 0,
-            'max_wait': -1
-        }
+        if engine == 'fast':
+            return self._run_fast(event_file, checkpoint_file)
+        if engine != 'object':
+            raise ValueError('unknown engine {}'.format(engine))
+        self._incoming = open_events(event_file)
+        self._pending = self._read_event()
+        return self._continue(checkpoint_file, checkpoint_every)
 
-        initial_events = create_event_list(event_file)
-        max_times = []
+    def resume(self, event_file, checkpoint_file=None,
+               checkpoint_every=1000000):
+        """Finish running a simulation restored by load_checkpoint or
+        stopped by advance, and return its statistics as run does.
+
+        @type self: GroceryStoreSimulation
+        @type event_file: str | Trace
+            The events the simulation was running on.
+        @type checkpoint_file: str | None
+        @type checkpoint_every: int
+        @rtype: dict[str, object]
+        """
+        self._incoming = open_events(event_file, self._consumed)
+        return self._continue(checkpoint_file, checkpoint_every)
+
+    def advance(self, event_file, until):
+        """Start running the simulation on the events of <event_file>, and
+        stop before the first event due at or after time <until>.
+
+        The simulation can then be changed, e.g. by opening lines in its
+        store, and finished with resume. See whatif.py.
+
+        @type self: GroceryStoreSimulation
+        @type event_file: str | Trace
+        @type until: int
+        @rtype: None
+        """
+        self._incoming = open_events(event_file)
+        self._pending = self._read_event()
+        self._continue(None, 1, until)
+
+    def open_line(self, line_type):
+        """Open a new, empty checkout line of type <line_type> in the store,
+        and return it.
+
+        @type self: GroceryStoreSimulation
+        @type line_type: type | str
+            See GroceryStore.open_line.
+        @rtype: CheckoutLine
+        """
+        return self._store.open_line(line_type)
+
+    def close_line(self, line_id, timestamp):
+        """Close the checkout line with id <line_id> at time <timestamp>.
+
+        The line closes as if the event file closed it, except that events
+        of the event file due at the same time are performed first.
+
+        @type self: GroceryStoreSimulation
+        @type line_id: int
+        @type timestamp: int
+        @rtype: None
+        """
+        event = CloseLine(timestamp)
+        event.line = self._store.lines[line_id]
+        self._events.add(event)
+
+    def _run_fast(self, event_file, checkpoint_file):
+        """Run the simulation on <event_file> with the fast engine, and
+        return its statistics as run does.
+
+        @type self: GroceryStoreSimulation
+        @type event_file: str | Trace
+        @type checkpoint_file: str | None
+        @rtype: dict[str, object]
+        """
+        if checkpoint_file is not None or self._profiler is not None or \
+                self._store.costumers.spills():
+            raise ValueError('the fast engine cannot checkpoint, profile or '
+                             'write a costumer file')
+        num_customers, self._total_time = simulate_fast(
+            self._store, event_file, self._collector)
+        return self._stats(num_customers)
+
+    def _read_event(self):
+        """Return the next event of the event file, or None if there is
+        none left.
+
+        @type self: GroceryStoreSimulation
+        @rtype: Event | None
+        """
+        event = next(self._incoming, None)
+        if event is None:
+            return None
+        self._consumed += 1
+        if type(event) is JoinLine:
+            self._store.costumers.add(event.cos)
+        else:
+            event.line = self._store.lines[event.line]
+            # To avoid creating another public attribute for the class
+            # CloseLine, I intentionally stored the index of the line that
+            # will close in a " wrong " attribute (in event.line) from the
+            # create_event_list function, and here I fix it. Closed lines
+            # keep their place in store.lines, so the index is the line's
+            # id.
+        return event
 
-        for event in initial_events:
-            self._events.add(event)
-            if type(event) is JoinLine:
-                self._store.costumers.add(event.cos)
+    def _horizon(self):
+        """Return the timestamp of the next event, from the event file or
+        the event queue, or infinity if there is none.
+
+        @type self: GroceryStoreSimulation
+        @rtype: int | float
+        """
+        horizon = float('inf')
+        if self._pending is not None:
+            horizon = self._pending.timestamp
+        if not self._events.is_empty():
+            horizon = min(horizon, self._events.peek().timestamp)
+        return horizon
+
+    def _continue(self, checkpoint_file, checkpoint_every, until=None):
+        """Perform events until there are none left, or until the next one
+        is due at or after <until>, and return the statistics of the
+        simulation.
+
+        @type self: GroceryStoreSimulation
+        @type checkpoint_file: str | None
+        @type checkpoint_every: int
+        @type until: int | None
+        @rtype: dict[str, object]
+        """
+        # Events are read from the file lazily. An event from the file is
+        # performed as soon as no queued event is older than it; on a tie it
+        # goes first, since it would have been queued before any event
+        # spawned during the simulation.
+        events = self._events
+        profiler = self._profiler
+        countdown = checkpoint_every
+        if until is None:
+            until = float('inf')
+        while self._pending is not None or not events.is_empty():
+            if until != float('inf') and self._horizon() >= until:
+                break
+            if self._pending is not None and (
+                    events.is_empty() or
+                    self._pending.timestamp <= events.peek().timestamp):
+                next_event = self._pending
+                self._pending = self._read_event()
             else:
-                event.line = self._store.lines[event.line]
-                # To avoid creating another public attribute for the class
-                # CloseLine, I intentionally stored the index of the line that
-                # will close in a " wrong " attribute (in event.line) from the
-                # create_event_list function, and here I fix it.
-
-        while not self._events.is_empty():
-            next_event = self._events.remove()
-            new_events = next_event.do(self._store)
+                next_event = events.remove()
+            if profiler is not None:
+                new_events = profiler.perform(next_event, self._store)
+            elif self._bulk_close and type(next_event) is CloseLine:
+                new_events = next_event.do_in_bulk(
+                    self._store, min(self._horizon(), until))
+            else:
+                new_events = next_event.do(self._store)
             if type(next_event) is FinishCheckingOut:
-                max_times.append(next_event.cos.total_time_waited)
+                self._collector.record(next_event.cos.total_time_waited,
+                                       next_event.line)
+                self._store.costumers.retire(next_event.cos)
             for event in new_events:
-                self._events.add(event)
-            stats['total_time'] = next_event.timestamp
+                events.add(event)
+            self._total_time = next_event.timestamp
+            if checkpoint_file is not None:
+                countdown -= 1
+                if countdown == 0:
+                    self._checkpoint(checkpoint_file)
+                    countdown = checkpoint_every
+        self._wait_for_checkpoint(True)
+        self._store.costumers.close()
+        return self._stats(len(self._store.costumers))
+
+    def _stats(self, num_customers):
+        """Return the statistics of this simulation, which had
+        <num_customers> costumers.
 
-        stats['num_customers'] = len(self._store.costumers)
-        stats['max_wait'] = max(max_times)
+        @type self: GroceryStoreSimulation
+        @type num_customers: int
+        @rtype: dict[str, object]
+        """
+        stats = {
+            'num_customers': num_customers,
+            'total_time': self._total_time,
+            'wait_stats': self._collector.summary()
+        }
+        stats['max_wait'] = stats['wait_stats']['max']
         return stats
 
+    def _checkpoint(self, filename):
+        """Save the state of this simulation to <filename>.
+
+        If possible, the state is written by a forked child process, which
+        sees a copy-on-write snapshot of the simulation. A checkpoint is
+        skipped if the previous one is still being written.
+
+        @type self: GroceryStoreSimulation
+        @type filename: str
+        @rtype: None
+        """
+        if not hasattr(os, 'fork'):
+            save_checkpoint(self, filename)
+            return
+        if not self._wait_for_checkpoint(False):
+            return
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                save_checkpoint(self, filename)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            os._exit(status)
+        self._checkpoint_pid = pid
+
+    def _wait_for_checkpoint(self, block):
+        """Return True iff no checkpoint is being written, after waiting for
+        the one being written if <block> is True.
+
+        @type self: GroceryStoreSimulation
+        @type block: bool
+        @rtype: bool
+        """
+        if self._checkpoint_pid is None:
+            return True
+        pid, status = os.waitpid(self._checkpoint_pid,
+                                 0 if block else os.WNOHANG)
+        if pid == 0:
+            return False
+        self._checkpoint_pid = None
+        if status != 0:
+            warnings.warn('writing a checkpoint failed')
+        return True
+
+
+# The first bytes of a checkpoint file.
+_CHECKPOINT_MAGIC = b'GSC1'
+
+
+def save_checkpoint(simulation, filename):
+    """Save the state of <simulation> to <filename>.
+
+    The state is pickled and compressed. It is written to a temporary file
+    which then replaces <filename>, so <filename> always holds a complete
+    checkpoint.
+
+    @type simulation: GroceryStoreSimulation
+    @type filename: str
+    @rtype: None
+    """
+    data = zlib.compress(
+        pickle.dumps(simulation, pickle.HIGHEST_PROTOCOL), 1)
+    temporary = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(temporary, 'wb') as file:
+        file.write(_CHECKPOINT_MAGIC)
+        file.write(data)
+    os.replace(temporary, filename)
+
+
+def load_checkpoint(filename):
+    """Return the simulation saved in the checkpoint file <filename>.
+
+    A restored simulation finishes with the same statistics as a run which
+    was never interrupted:
+
+    >>> import tempfile
+    >>> from generate import store_config, write_events
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> events = os.path.join(directory.name, 'events.txt')
+    >>> checkpoint = os.path.join(directory.name, 'checkpoint')
+    >>> write_events(events, 3000, close_rate=0.002)
+    >>> full = GroceryStoreSimulation(store_config()).run(events)
+    >>> for queue in ('heap', 'calendar'):
+    ...     stats = GroceryStoreSimulation(store_config(), queue=queue).run(
+    ...         events, checkpoint_file=checkpoint, checkpoint_every=700)
+    ...     restored = load_checkpoint(checkpoint)
+    ...     print(queue, stats == full, restored.resume(events) == full)
+    heap True True
+    calendar True True
+    >>> directory.cleanup()
+
+    @type filename: str
+    @rtype: GroceryStoreSimulation
+    """
+    with open(filename, 'rb') as file:
+        if file.read(len(_CHECKPOINT_MAGIC)) != _CHECKPOINT_MAGIC:
+            raise ValueError('{} is not a checkpoint file'.format(filename))
+        return pickle.loads(zlib.decompress(file.read()))
+
 
 if __name__ == '__main__':
-    sim = GroceryStoreSimulation('config.json')
-    final_stats = sim.run('events.txt')
+    # The configuration and event files may be given on the command line;
+    # see chain.py to simulate several stores at once.
+    files = ['config.json', 'events.txt']
+    files[:len(sys.argv[1:3])] = sys.argv[1:3]
+    sim = GroceryStoreSimulation(files[0])
+    final_stats = sim.run(files[1])
     print(final_stats)
@@ -0,0 +1,264 @@
+"""Assignment 1 - Simulation Statistics
+
+This file contains the classes which collect statistics on the time
+costumers spend in the grocery store while a simulation runs.
+"""
+from bisect import insort
+
+
+class StatsCollector:
+    """A collector of costumer wait times.
+
+    This is an abstract class. Only child classes should be instantiated.
+    """
+
+    def record(self, wait, line):
+        """Record that a costumer left the store after waiting <wait>.
+
+        @type self: StatsCollector
+        @type wait: int
+            The total time the costumer spent in the store.
+        @type line: CheckoutLine
+            The line where the costumer checked out.
+        @rtype: None
+        """
+        raise NotImplementedError
+
+    def summary(self):
+        """Return a dictionary of the statistics collected so far.
+
+        The dictionary has at least the key 'max', the longest wait
+        recorded, or -1 if none was.
+
+        @type self: StatsCollector
+        @rtype: dict[str, object]
+        """
+        raise NotImplementedError
+
+
+class WaitStats(StatsCollector):
+    """A StatsCollector of the maximum, mean, variance and quantiles of the
+    wait times, overall and per type of checkout line.
+
+    Each wait is recorded in constant time and space: the mean and variance
+    are updated with Welford's method, and each quantile is estimated with
+    the P-square algorithm.
+    """
+    # === Private Attributes ===
+    # @type _count: int
+    #     The number of waits recorded.
+    # @type _max: int
+    #     The longest wait recorded, or -1 if none was.
+    # @type _mean: float
+    #     The mean of the waits recorded.
+    # @type _squares: float
+    #     The sum of the squared differences between the waits recorded and
+    #     their mean.
+    # @type _quantiles: dict[str, _P2Quantile]
+    #     The estimator of each quantile, by name.
+    # @type _by_line_type: dict[str, WaitStats] | None
+    #     The statistics of each type of checkout line, by class name, or
+    #     None if they are not collected.
+
+    QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+    def __init__(self, by_line_type=True):
+        """Initialize an empty WaitStats.
+
+        @type self: WaitStats
+        @type by_line_type: bool
+            Whether to also collect statistics for each type of line.
+        @rtype: None
+        """
+        self._count = 0
+        self._max = -1
+        self._mean = 0.0
+        self._squares = 0.0
+        self._quantiles = {}
+        for name, p in self.QUANTILES:
+            self._quantiles[name] = _P2Quantile(p)
+        self._by_line_type = {} if by_line_type else None
+
+    def record(self, wait, line):
+        """Record that a costumer left the store after waiting <wait>.
+
+        @type self: WaitStats
+        @type wait: int
+        @type line: CheckoutLine
+        @rtype: None
+
+        >>> stats = WaitStats(by_line_type=False)
+        >>> for wait in [4, 8, 6]:
+        ...     stats.record(wait, None)
+        >>> summary = stats.summary()
+        >>> summary['max'], summary['mean'], summary['variance']
+        (8, 6.0, 4.0)
+        >>> summary['p50']
+        6
+        """
+        self._count += 1
+        if wait > self._max:
+            self._max = wait
+        delta = wait - self._mean
+        self._mean += delta / self._count
+        self._squares += delta * (wait - self._mean)
+        for estimator in self._quantiles.values():
+            estimator.add(wait)
+        if self._by_line_type is not None:
+            name = type(line).__name__
+            if name not in self._by_line_type:
+                self._by_line_type[name] = WaitStats(by_line_type=False)
+            self._by_line_type[name].record(wait, line)
+
+    def summary(self):
+        """Return a dictionary of the statistics collected so far.
+
+        The keys are 'count', 'max', 'mean', 'variance' (the sample
+        variance), one key per quantile ('p50', 'p95' and 'p99'), and, if
+        collected, 'by_line_type', which maps each line type name to a
+        summary of its own. Statistics which are undefined for the number of
+        waits recorded are None.
+
+        @type self: WaitStats
+        @rtype: dict[str, object]
+        """
+        summary = {'count': self._count, 'max': self._max,
+                   'mean': None, 'variance': None}
+        if self._count > 0:
+            summary['mean'] = self._mean
+        if self._count > 1:
+            summary['variance'] = self._squares / (self._count - 1)
+        for name, _ in self.QUANTILES:
+            summary[name] = self._quantiles[name].value()
+        if self._by_line_type is not None:
+            summary['by_line_type'] = {}
+            for name, stats in sorted(self._by_line_type.items()):
+                summary['by_line_type'][name] = stats.summary()
+        return summary
+
+
+class _P2Quantile:
+    """A streaming estimate of a quantile, by the P-square algorithm of Jain
+    and Chlamtac.
+
+    Five markers are kept: the minimum, the maximum, the estimated quantile
+    and two points halfway to the extremes. Marker heights are adjusted with
+    piecewise-parabolic interpolation as observations arrive. Until five
+    observations have been seen, the quantile is computed exactly.
+    """
+    # === Private Attributes ===
+    # @type _p: float
+    #     The quantile estimated, between 0 and 1.
+    # @type _count: int
+    #     The number of observations.
+    # @type _heights: list[float]
+    #     The heights of the markers, in increasing order.
+    # @type _positions: list[int]
+    #     The actual positions of the markers.
+    # @type _desired: list[float]
+    #     The desired positions of the markers.
+    # @type _increments: list[float]
+    #     How much each desired position grows per observation.
+
+    def __init__(self, p):
+        """Initialize an estimator of the <p> quantile.
+
+        @type self: _P2Quantile
+        @type p: float
+        @rtype: None
+        """
+        self._p = p
+        self._count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        """Add the observation <x>.
+
+        @type self: _P2Quantile
+        @type x: int | float
+        @rtype: None
+        """
+        q = self._heights
+        self._count += 1
+        if self._count <= 5:
+            insort(q, x)
+            return
+        # Markers k to 4 are above x, and move up one position. The extreme
+        # markers are never interpolated, so only their positions are kept
+        # up to date, and the desired positions of markers 1 to 3.
+        if x < q[0]:
+            q[0] = x
+            k = 1
+        elif x >= q[4]:
+            q[4] = x
+            k = 4
+        elif x < q[1]:
+            k = 1
+        elif x < q[2]:
+            k = 2
+        elif x < q[3]:
+            k = 3
+        else:
+            k = 4
+        n = self._positions
+        if k <= 1:
+            n[1] += 1
+        if k <= 2:
+            n[2] += 1
+        if k <= 3:
+            n[3] += 1
+        n[4] += 1
+        desired = self._desired
+        increments = self._increments
+        desired[1] += increments[1]
+        desired[2] += increments[2]
+        desired[3] += increments[3]
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if d >= 1:
+                if n[i + 1] - n[i] <= 1:
+                    continue
+                d = 1
+            elif d <= -1:
+                if n[i - 1] - n[i] >= -1:
+                    continue
+                d = -1
+            else:
+                continue
+            height = self._parabolic(i, d)
+            if not q[i - 1] < height < q[i + 1]:
+                height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+            q[i] = height
+            n[i] += d
+
+    def _parabolic(self, i, d):
+        """Return the new height of marker <i> moved by <d> positions,
+        predicted by the piecewise-parabolic formula.
+
+        @type self: _P2Quantile
+        @type i: int
+        @type d: int
+        @rtype: float
+        """
+        q = self._heights
+        n = self._positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        """Return the current estimate of the quantile, or None if nothing
+        was observed.
+
+        @type self: _P2Quantile
+        @rtype: int | float | None
+        """
+        q = self._heights
+        if self._count == 0:
+            return None
+        if self._count <= 5:
+            return q[min(len(q) - 1, int(self._p * len(q)))]
+        return q[2]
@@ -2,8 +2,42 @@
 
 This file should contain all of the classes necessary to model the entities
 in a grocery store.
+
+Besides the built-in Cashier, Express and SelfServe lines, a store
+configuration may declare its own types of checkout line, e.g.
+
+    "line_types": {"Bagger": {"fixed": 10, "per_item": 2,
+                               "item_limit": null}},
+    "line_counts": {"Bagger": 2}
+
+A declared line takes fixed + per_item * items to checkout a costumer, and
+only takes costumers with at most item_limit items (any number if null).
+Its checkout times may also be random, e.g.
+
+    "line_types": {"Cashier": {"fixed": 7, "per_item": 1,
+                                "distribution": "lognormal", "spread": 0.3}},
+    "seed": 42
+
+draws each checkout time around fixed + per_item * items from one of
+DISTRIBUTIONS (see DeclaredLine), with the store's random number
+generator, which is seeded with the configuration's seed (0 if unset).
+A declaration named after a registered line type, like Cashier above,
+keeps the item_limit, fixed and per_item of that type unless it sets
+them.
+Line types with an arbitrary checkout time function are CheckoutLine
+subclasses overriding time_to_checkout; register_line_type makes them
+available to configurations.
 """
 import json
+import random
+from collections import deque
+
+# The number of entries in the precomputed checkout time table of a line
+# type, i.e. checkout times are looked up for fewer than this many items.
+TABLE_SIZE = 128
+
+# The distributions the checkout times of a declared line type may follow.
+DISTRIBUTIONS = ('exponential', 'lognormal', 'uniform')
 
 
 class GroceryStore:
@@ -11,70 +45,151 @@ class GroceryStore:
 
     A grocery store contains customers and checkout lines.
 
+    Costumers must join and leave the checkout lines through the
+    <join_line> and <leave_line> methods, which keep the index used by
+    <assign_to_line> up to date.
+
     === Attributes ===
     @type lines: list[CheckoutLine]
-        A list of checkout lines in this grocery store.
-    @type costumers: set[Costumer]
-        A collection of costumers in the grocery store.
+        All the checkout lines of this grocery store, open or closed. A line
+        keeps its place in this list when it closes, so each line's position
+        is its id.
+    @type costumers: CostumerRegistry
+        The costumers who came into the grocery store. Only those who have
+        not finished checking out yet are kept.
+    @type trace_checkouts: bool
+        Whether a CheckingOut event is spawned when a costumer reaches the
+        head of a line. If False, the FinishCheckingOut event is spawned
+        directly, which halves the events per costumer.
+    @type rng: random.Random
+        The random number generator of the lines with random checkout
+        times.
     """
 
     # === Private Attributes ===
     # @type _lines_capacity: int
     #    The maximum number of costumers allowed to join a checkout line.
+    # @type _open: bytearray
+    #    _open[i] is 1 iff the line with id i is open.
+    # @type _open_count: int
+    #    The number of open lines.
+    # @type _indexes: dict[int | None, _LineIndex]
+    #    The lengths of the open lines, grouped by item limit.
 
     def __init__(self, filename):
         """Initialize a GroceryStore from a configuration file <filename>.
 
-        @type filename: str
+        @type filename: str | dict[str, object]
             The name of the file containing the configuration for the
-            grocery store.
+            grocery store, or the configuration itself.
         @rtype: None
         """
-        with open(filename, 'r') as file:
-            config = json.load(file)
+        if isinstance(filename, dict):
+            config = filename
+        else:
+            with open(filename, 'r') as file:
+                config = json.load(file)
+        line_types = dict(LINE_TYPES)
+        for name, spec in config.get('line_types', {}).items():
+            line_types[name] = make_line_type(name, spec)
+        counts = [('Cashier', config.get('cashier_count', 0)),
+                  ('Express', config.get('express_count', 0)),
+                  ('SelfServe', config.get('self_serve_count', 0))]
+        counts.extend(config.get('line_counts', {}).items())
         lines_list = []
         lines_cap = config['line_capacity']
-        for i in range(config['cashier_count']):
-            lines_list.append(Cashier())
-        for i in range(config['express_count']):
-            lines_list.append(Express())
-        for i in range(config['self_serve_count']):
-            lines_list.append(SelfServe())
+        for name, count in counts:
+            if name not in line_types:
+                raise ValueError('unknown line type {}'.format(name))
+            for i in range(count):
+                lines_list.append(line_types[name]())
         self.lines = lines_list
-        self.costumers = set()
+        self.costumers = CostumerRegistry()
+        self.trace_checkouts = False
+        self.rng = random.Random(config.get('seed', 0))
         self._lines_capacity = lines_cap
+        self._open = bytearray([1]) * len(lines_list)
+        self._open_count = len(lines_list)
+        for i in range(len(lines_list)):
+            lines_list[i].id = i
+            if lines_list[i].distribution is not None:
+                lines_list[i].rng = self.rng
+        self._build_indexes()
 
-    def _is_allowed(self, line, cos):
-        """This is a helper function used *only* in the <assign_to_line> method.
+    def _build_indexes(self):
+        """Build the index of the open lines' lengths from scratch.
 
-        Return True if and only if the costumer <cos> is allowed to join the
-        checkout line <line>.
+        @type self: GroceryStore
+        @rtype: None
+        """
+        self._indexes = {}
+        for line in self.lines:
+            if line.item_limit not in self._indexes:
+                self._indexes[line.item_limit] = _LineIndex(len(self.lines))
+            self._line_changed(line)
+
+    def _index_of(self, line):
+        """Return the _LineIndex that holds <line> while it is open.
 
         @type self: GroceryStore
-        @type cos: Costumer
         @type line: CheckoutLine
-        @rtype: Bool
+        @rtype: _LineIndex
         """
-        if type(line) is Express:
-            return cos.items < 8
-        return True
+        return self._indexes[line.item_limit]
 
-    def _helper_on_lines(self, lines):
-        """This is a helper function used *only* in the <assign_to_line> method.
+    def _line_changed(self, line):
+        """Update the index entry of <line> after its length changed.
 
-        It takes a list of checkout lines that the costumer is theoretically
-        allowed to join and returns the one he/she will actually join according
-        to the algorithm.
+        Closed lines are not indexed, so nothing happens for them.
 
         @type self: GroceryStore
-        @type lines: list [CheckoutLine]
-        @rtype: CheckoutLine
+        @type line: CheckoutLine
+        @rtype: None
+        """
+        if self._open[line.id]:
+            self._index_of(line).update(line.id, len(line.costumers_list))
+
+    def is_open(self, line):
+        """Return True iff the checkout line <line> is open.
+
+        @type self: GroceryStore
+        @type line: CheckoutLine
+        @rtype: bool
+        """
+        return self._open[line.id] == 1
+
+    def open_lines(self):
+        """Return the open checkout lines of this store, in id order.
+
+        @type self: GroceryStore
+        @rtype: list[CheckoutLine]
+        """
+        return [line for line in self.lines if self._open[line.id]]
+
+    def join_line(self, line, costumer):
+        """Add <costumer> to the end of the checkout line <line>.
+
+        @type self: GroceryStore
+        @type line: CheckoutLine
+        @type costumer: Costumer
+        @rtype: None
         """
-        k = 0
-        for i in range(len(lines)):
-            if len(lines[i].costumers_list) < len(lines[k].costumers_list):
-                k = i
-        return lines[k]
+        line.costumers_list.append(costumer)
+        self._line_changed(line)
+
+    def leave_line(self, line, costumer):
+        """Remove <costumer> from the checkout line <line>.
+
+        @type self: GroceryStore
+        @type line: CheckoutLine
+        @type costumer: Costumer
+        @rtype: None
+        """
+        if line.costumers_list[0] is costumer:
+            line.costumers_list.popleft()
+        else:
+            line.costumers_list.remove(costumer)
+        self._line_changed(line)
 
     def assign_to_line(self, costumer):
         """Return the line that the costumer should join.
@@ -90,15 +205,21 @@ class GroceryStore:
         @type costumer: Costumer
         @rtype: CheckoutLine
         """
-        if len(self.lines) == 1:
-            return self.lines[0]
-        else:
-            checkout_lines = []
-            for line in self.lines:
-                if self._is_allowed(line, costumer) and \
-                        len(line.costumers_list) < self._lines_capacity:
-                    checkout_lines.append(line)
-        return self._helper_on_lines(checkout_lines)
+        only_line = self._open_count == 1
+        best = float('inf')
+        chosen = None
+        for limit, index in self._indexes.items():
+            if only_line or limit is None or costumer.items <= limit:
+                if index.minimum() < best:
+                    best = index.minimum()
+                    chosen = index
+        if chosen is not None:
+            length, line_id = chosen.unpack(best)
+            # The only open line takes everyone, whatever its length.
+            if only_line or length < self._lines_capacity:
+                return self.lines[line_id]
+        raise IndexError('no checkout line can take costumer {}'.format(
+            costumer.id))
 
     def close(self, line):
         """Close the checkout line <line> in the grocery store.
@@ -107,7 +228,137 @@ class GroceryStore:
         @type line: CheckoutLine
         @rtype: None
         """
-        self.lines.remove(line)
+        if not self._open[line.id]:
+            raise ValueError('line {} is already closed'.format(line.id))
+        self._open[line.id] = 0
+        self._open_count -= 1
+        self._index_of(line).update(line.id, None)
+
+    def open_line(self, line_type):
+        """Open a new, empty checkout line of type <line_type>, and return
+        it.
+
+        The line is added at the end of <lines>, so its id is the number of
+        lines the store had.
+
+        @type self: GroceryStore
+        @type line_type: type | str
+            A CheckoutLine subclass, or the name of a registered line type
+            or of the type of a line of this store.
+        @rtype: CheckoutLine
+
+        >>> store = GroceryStore({'cashier_count': 1, 'line_capacity': 5})
+        >>> line = store.open_line('Express')
+        >>> line.id, len(store.open_lines())
+        (1, 2)
+        """
+        if isinstance(line_type, str):
+            types = dict(LINE_TYPES)
+            for line in self.lines:
+                types.setdefault(type(line).__name__, type(line))
+            if line_type not in types:
+                raise ValueError('unknown line type {}'.format(line_type))
+            line_type = types[line_type]
+        line = line_type()
+        line.id = len(self.lines)
+        if line.distribution is not None:
+            line.rng = self.rng
+        self.lines.append(line)
+        self._open.append(1)
+        self._open_count += 1
+        # The index encodes line ids, so it is rebuilt for the new size.
+        self._build_indexes()
+        return line
+
+
+class _LineIndex:
+    """An index of line lengths which finds the shortest line quickly.
+
+    The index has a fixed number of slots, one per line position. Each slot
+    holds the length of a line, or nothing. The slot with the smallest
+    length, the lowest position among equal lengths, is found in constant
+    time, and a slot is updated in O(log n) time.
+
+    Entries are encoded as single integers, length * size + position, so
+    that the smallest entry is the one wanted.
+    """
+    # === Private Attributes ===
+    # @type _size: int
+    #    The number of slots.
+    # @type _leaves: int
+    #    The number of leaves of the tree, a power of two >= _size.
+    # @type _tree: list[int]
+    #    A complete binary tree stored as a list, where the children of node
+    #    i are nodes 2i and 2i + 1 and the leaves start at _leaves. Each node
+    #    holds the smallest entry among the leaves below it.
+    # @type _empty: int
+    #    The entry of a slot holding nothing; larger than any other entry.
+
+    def __init__(self, size):
+        """Initialize a _LineIndex with <size> empty slots.
+
+        @type self: _LineIndex
+        @type size: int
+        @rtype: None
+        """
+        self._size = max(size, 1)
+        self._leaves = 1
+        while self._leaves < self._size:
+            self._leaves *= 2
+        self._empty = float('inf')
+        self._tree = [self._empty] * (2 * self._leaves)
+
+    def update(self, position, length):
+        """Set the slot <position> to <length>, or empty it if <length> is
+        None.
+
+        @type self: _LineIndex
+        @type position: int
+        @type length: int | None
+        @rtype: None
+
+        >>> index = _LineIndex(3)
+        >>> index.update(2, 0)
+        >>> index.update(0, 1)
+        >>> index.unpack(index.minimum())
+        (0, 2)
+        >>> index.update(2, None)
+        >>> index.unpack(index.minimum())
+        (1, 0)
+        """
+        tree = self._tree
+        i = self._leaves + position
+        if length is None:
+            tree[i] = self._empty
+        else:
+            tree[i] = length * self._size + position
+        i //= 2
+        while i > 0:
+            left = tree[2 * i]
+            right = tree[2 * i + 1]
+            tree[i] = left if left < right else right
+            i //= 2
+
+    def minimum(self):
+        """Return the smallest entry of this index.
+
+        @type self: _LineIndex
+        @rtype: int | float
+        """
+        return self._tree[1]
+
+    def unpack(self, entry):
+        """Return the (length, position) pair encoded by <entry>.
+
+        An empty entry unpacks to an infinite length.
+
+        @type self: _LineIndex
+        @type entry: int | float
+        @rtype: (int | float, int | None)
+        """
+        if entry == self._empty:
+            return self._empty, None
+        return divmod(entry, self._size)
 
 
 class Costumer:
@@ -125,6 +376,8 @@ class Costumer:
     @type total_time_waited: int
         The total time a costumer spent in the grocery store.
     """
+    __slots__ = ('id', 'items', 'joined_store', 'total_time_waited')
+
     def __init__(self, name, items):
         """Initialize a Costumer.
 
@@ -145,20 +398,247 @@ class Costumer:
         self.total_time_waited = None
 
 
+class CostumerRegistry:
+    """The costumers who came into a grocery store.
+
+    Costumers are added when they arrive and retired when they finish
+    checking out, so only the costumers currently in the store are kept;
+    the others are only counted. The len of a registry is the number of
+    costumers ever added.
+
+    The record of each retired costumer can be spilled to a file, as
+    tab-separated lines of id, items, joined_store and total_time_waited.
+    Records are written in batches, and a registry can be pickled with its
+    unwritten batch: the file is closed in the unpickled registry, and when
+    it next writes, the file is cut back to the records written before the
+    pickle, so that a resumed simulation writes each record once.
+
+    >>> registry = CostumerRegistry()
+    >>> a, b = Costumer('a', 1), Costumer('b', 2)
+    >>> registry.add(a)
+    >>> registry.add(b)
+    >>> registry.retire(a)
+    >>> len(registry), registry.active_count(), a in registry, b in registry
+    (2, 1, False, True)
+    """
+    # === Private Attributes ===
+    # @type _active: set[Costumer]
+    #     The costumers added and not retired yet.
+    # @type _count: int
+    #     The number of costumers ever added.
+    # @type _spill_file: str | None
+    #     The file retired costumers are written to, if any.
+    # @type _file: io.FileIO | None
+    #     _spill_file, opened for appending, or None if it is closed.
+    # @type _written: int
+    #     The number of bytes written to _spill_file.
+    # @type _batch: list[str]
+    #     The records of retired costumers not written yet.
+
+    # The number of records written to the spill file at once.
+    BATCH_SIZE = 4096
+
+    def __init__(self, spill_file=None):
+        """Initialize an empty CostumerRegistry.
+
+        @type self: CostumerRegistry
+        @type spill_file: str | None
+            The file to write the records of retired costumers to, which is
+            truncated, or None not to keep them.
+        @rtype: None
+        """
+        self._active = set()
+        self._count = 0
+        self._spill_file = spill_file
+        self._file = None
+        self._written = 0
+        self._batch = []
+        if spill_file is not None:
+            self._file = open(spill_file, 'wb', buffering=0)
+
+    def __getstate__(self):
+        """Return the state of this registry to pickle.
+
+        @type self: CostumerRegistry
+        @rtype: dict[str, object]
+        """
+        state = dict(self.__dict__)
+        state['_file'] = None
+        return state
+
+    def __len__(self):
+        """Return the number of costumers ever added to this registry.
+
+        @type self: CostumerRegistry
+        @rtype: int
+        """
+        return self._count
+
+    def __contains__(self, costumer):
+        """Return True iff <costumer> was added and not retired yet.
+
+        @type self: CostumerRegistry
+        @type costumer: Costumer
+        @rtype: bool
+        """
+        return costumer in self._active
+
+    def __iter__(self):
+        """Return an iterator over the costumers not retired yet.
+
+        @type self: CostumerRegistry
+        @rtype: iterator[Costumer]
+        """
+        return iter(self._active)
+
+    def active_count(self):
+        """Return the number of costumers added and not retired yet.
+
+        @type self: CostumerRegistry
+        @rtype: int
+        """
+        return len(self._active)
+
+    def spills(self):
+        """Return True iff the records of retired costumers are written to
+        a file.
+
+        @type self: CostumerRegistry
+        @rtype: bool
+        """
+        return self._spill_file is not None
+
+    def add(self, costumer):
+        """Add the costumer <costumer>, who just came into the store.
+
+        @type self: CostumerRegistry
+        @type costumer: Costumer
+        @rtype: None
+        """
+        self._active.add(costumer)
+        self._count += 1
+
+    def retire(self, costumer):
+        """Retire the costumer <costumer>, who finished checking out.
+
+        @type self: CostumerRegistry
+        @type costumer: Costumer
+        @rtype: None
+        """
+        self._active.discard(costumer)
+        if self._spill_file is not None:
+            self._batch.append('{}\t{}\t{}\t{}\n'.format(
+                costumer.id, costumer.items, costumer.joined_store,
+                costumer.total_time_waited))
+            if len(self._batch) >= self.BATCH_SIZE:
+                self.flush()
+
+    def flush(self):
+        """Write the records not written yet to the spill file, if any.
+
+        A registry unpickled from an earlier state first cuts the file back
+        to the records written before that state, so each record is in the
+        file once:
+
+        >>> import os, pickle, tempfile
+        >>> directory = tempfile.TemporaryDirectory()
+        >>> spill = os.path.join(directory.name, 'costumers.tsv')
+        >>> registry = CostumerRegistry(spill)
+        >>> a, b, c = Costumer('a', 1), Costumer('b', 2), Costumer('c', 3)
+        >>> for costumer in (a, b, c):
+        ...     registry.add(costumer)
+        ...     costumer.joined_store = costumer.total_time_waited = 0
+        >>> registry.retire(a)
+        >>> registry.flush()
+        >>> registry.retire(b)
+        >>> state = pickle.dumps(registry)
+        >>> registry.retire(c)
+        >>> registry.close()
+        >>> restored = pickle.loads(state)
+        >>> restored.retire(c)
+        >>> restored.close()
+        >>> with open(spill) as file:
+        ...     [line.split('\\t')[0] for line in file]
+        ['a', 'b', 'c']
+        >>> directory.cleanup()
+
+        @type self: CostumerRegistry
+        @rtype: None
+        """
+        if self._spill_file is not None and self._batch:
+            if self._file is None:
+                # Reopen the file where this registry left it.
+                self._file = open(self._spill_file, 'r+b', buffering=0)
+                self._file.truncate(self._written)
+                self._file.seek(self._written)
+            data = memoryview(''.join(self._batch).encode())
+            # An unbuffered file may write only part of the data at once.
+            while data:
+                written = self._file.write(data)
+                self._written += written
+                data = data[written:]
+            self._batch = []
+
+    def close(self):
+        """Write the records not written yet to the spill file, if any, and
+        close it. It is reopened if more costumers are retired.
+
+        @type self: CostumerRegistry
+        @rtype: None
+        """
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
 class CheckoutLine:
     """A checkout line in the grocery store.
 
     === Attributes ===
-    @type costumers_list: list[Costumer]
-        A list of costumers queueing in the checkout line.
+    @type costumers_list: deque[Costumer]
+        The costumers queueing in the checkout line, the one checking out
+        first.
+    @type id: int | None
+        The position of this line in its grocery store's lines, or None if
+        the line does not belong to a store.
+    @type item_limit: int | None
+        The most items a costumer may have to join this type of line, or
+        None if there is no limit. This is a class attribute.
+    @type service_times: tuple[int]
+        service_times[n] is the time it takes to checkout n items, for the
+        first entries, precomputed for the whole type of line. It may be
+        empty, in which case time_to_checkout is always called. This is a
+        class attribute.
+    @type distribution: str | None
+        The distribution of the checkout times of this type of line, or
+        None if they are not random. This is a class attribute.
     """
+    __slots__ = ('costumers_list', 'id')
+    item_limit = None
+    service_times = ()
+    distribution = None
+
     def __init__(self):
         """Initialize a CheckoutLine.
 
         @type self: CheckoutLine
         @rtype: None
         """
-        self.costumers_list = []
+        self.costumers_list = deque()
+        self.id = None
+
+    def __init_subclass__(cls, **kwargs):
+        """Give every new type of line an empty service_times table, unless
+        it defines its own, so that a subclass overriding time_to_checkout
+        never uses the table of its parent.
+
+        @type cls: type
+        @rtype: None
+        """
+        super().__init_subclass__(**kwargs)
+        if 'service_times' not in cls.__dict__:
+            cls.service_times = ()
 
     def time_to_checkout(self, items):
         """Return the time it takes to checkout <items> items.
@@ -176,6 +656,8 @@ class Cashier(CheckoutLine):
     """A type of checkout line.
 
     """
+    __slots__ = ()
+
     def __init__(self):
         """Initialize this subclass.
 
@@ -201,7 +683,11 @@ class Cashier(CheckoutLine):
 class Express(CheckoutLine):
     """A type of checkout line.
 
+    Only costumers with fewer than 8 items may join an Express line.
     """
+    __slots__ = ()
+    item_limit = 7
+
     def __init__(self):
         """Initialize this subclass.
 
@@ -228,6 +714,8 @@ class SelfServe(CheckoutLine):
     """A type of checkout line.
 
     """
+    __slots__ = ()
+
     def __init__(self):
         """Initialize this subclass.
 
@@ -248,3 +736,206 @@ class SelfServe(CheckoutLine):
         23
         """
         return (2 * items) + 1
+
+
+class DeclaredLine(CheckoutLine):
+    """A type of checkout line declared in a store configuration.
+
+    A DeclaredLine takes <fixed> + <per_item> * items to checkout, on
+    average if its <distribution> is not None. The checkout time is then
+    drawn, and rounded to the nearest integer, from
+        - 'exponential': the exponential distribution;
+        - 'lognormal': a lognormal distribution whose logarithm has the
+          standard deviation <spread>;
+        - 'uniform': the uniform distribution between 1 - <spread> and
+          1 + <spread> times the average.
+    Actual types of declared line are subclasses created by make_line_type.
+
+    === Attributes ===
+    @type fixed: int
+        The checkout time which does not depend on the items. This is a
+        class attribute.
+    @type per_item: int
+        The checkout time per item. This is a class attribute.
+    @type spread: float
+        The spread of the distribution. This is a class attribute.
+    @type spec: dict[str, int | None]
+        The configuration entry the type was made from. This is a class
+        attribute.
+    @type rng: random.Random
+        The random number generator the checkout times are drawn with, if
+        they are random.
+    """
+    __slots__ = ('rng',)
+    fixed = 0
+    per_item = 1
+    spread = 0.0
+    spec = {}
+
+    def __reduce__(self):
+        """Return how to pickle this line.
+
+        Declared line types are made at run time, so they cannot be pickled
+        by reference like other classes; they are rebuilt from their name
+        and spec instead.
+
+        @type self: DeclaredLine
+        @rtype: tuple
+        """
+        return (_declared_line, (type(self).__name__, self.spec),
+                (None, {'costumers_list': self.costumers_list,
+                        'id': self.id,
+                        'rng': getattr(self, 'rng', None)}))
+
+    def time_to_checkout(self, items):
+        """This method overrides the one in the superclass.
+
+        @type self: DeclaredLine
+        @type items: int
+        @rtype: int
+
+        >>> Bagger = make_line_type('Bagger', {'fixed': 10, 'per_item': 2})
+        >>> Bagger().time_to_checkout(3)
+        16
+        >>> Slow = make_line_type('Slow', {'fixed': 100, 'per_item': 0,
+        ...                                'distribution': 'uniform',
+        ...                                'spread': 0.1})
+        >>> line = Slow()
+        >>> line.rng = random.Random(1)
+        >>> 90 <= line.time_to_checkout(3) <= 110
+        True
+        """
+        mean = self.fixed + self.per_item * items
+        if self.distribution is None or mean <= 0:
+            return mean
+        if self.distribution == 'exponential':
+            factor = self.rng.expovariate(1)
+        elif self.distribution == 'lognormal':
+            # The mean of this lognormal distribution is 1.
+            factor = self.rng.lognormvariate(-self.spread ** 2 / 2,
+                                             self.spread)
+        else:
+            factor = self.rng.uniform(1 - self.spread, 1 + self.spread)
+        return max(0, round(mean * factor))
+
+
+# The declared line types made so far, by name and sorted spec items.
+_DECLARED_TYPES = {}
+
+
+def make_line_type(name, spec):
+    """Return the type of checkout line called <name> described by the
+    configuration entry <spec>.
+
+    <spec> may set 'fixed', 'per_item', 'distribution', 'spread' (see
+    DeclaredLine) and 'item_limit' (see CheckoutLine). If <name> is a
+    registered line type, the settings <spec> leaves out are those of that
+    type. The same type is returned for the same name and spec.
+
+    >>> Random = make_line_type('Express', {'distribution': 'uniform'})
+    >>> Random.item_limit, Random.fixed, Random.per_item
+    (7, 4, 1)
+
+    @type name: str
+    @type spec: dict[str, int | None]
+    @rtype: type
+    """
+    unknown = set(spec) - {'fixed', 'per_item', 'item_limit',
+                           'distribution', 'spread'}
+    if unknown:
+        raise ValueError('unknown settings {} for line type {}'.format(
+            sorted(unknown), name))
+    if spec.get('distribution') not in (None,) + DISTRIBUTIONS:
+        raise ValueError('unknown distribution {} for line type {}'.format(
+            spec['distribution'], name))
+    if name in LINE_TYPES:
+        spec = _inherited_spec(LINE_TYPES[name], spec)
+    key = (name, tuple(sorted(spec.items())))
+    if key not in _DECLARED_TYPES:
+        line_type = type(name, (DeclaredLine,), {
+            '__slots__': (),
+            'fixed': spec.get('fixed', DeclaredLine.fixed),
+            'per_item': spec.get('per_item', DeclaredLine.per_item),
+            'item_limit': spec.get('item_limit'),
+            'distribution': spec.get('distribution'),
+            'spread': spec.get('spread', DeclaredLine.spread),
+            'spec': dict(spec)})
+        if line_type.distribution is None:
+            _build_service_times(line_type)
+        _DECLARED_TYPES[key] = line_type
+    return _DECLARED_TYPES[key]
+
+
+def _inherited_spec(line_type, spec):
+    """Return <spec> with the settings it leaves out taken from the
+    registered line type <line_type>.
+
+    The fixed and per_item times of <line_type> are read from its checkout
+    time table, so they are only known if its checkout times are tabulated
+    and grow linearly with the items.
+
+    @type line_type: type
+    @type spec: dict[str, int | None]
+    @rtype: dict[str, int | None]
+    """
+    inherited = {'item_limit': line_type.item_limit}
+    times = line_type.service_times
+    if len(times) > 1 and all(
+            times[n] == times[0] + (times[1] - times[0]) * n
+            for n in range(len(times))):
+        inherited['fixed'] = times[0]
+        inherited['per_item'] = times[1] - times[0]
+    elif 'fixed' not in spec or 'per_item' not in spec:
+        raise ValueError('line type {} has no fixed and per_item times to '
+                         'keep; set both'.format(line_type.__name__))
+    inherited.update(spec)
+    return inherited
+
+
+def _declared_line(name, spec):
+    """Return a new line of the declared type <name> described by <spec>.
+
+    This is used to unpickle DeclaredLine instances.
+
+    @type name: str
+    @type spec: dict[str, int | None]
+    @rtype: DeclaredLine
+    """
+    return make_line_type(name, spec)()
+
+
+def _build_service_times(line_type):
+    """Precompute the service_times table of the checkout line class
+    <line_type> from its time_to_checkout method.
+
+    @type line_type: type
+    @rtype: None
+    """
+    line = line_type()
+    line_type.service_times = tuple(
+        line.time_to_checkout(n) for n in range(TABLE_SIZE))
+
+
+# The types of checkout line a configuration may refer to, by name.
+LINE_TYPES = {}
+
+
+def register_line_type(line_type, precompute=False):
+    """Make the CheckoutLine subclass <line_type> available to store
+    configurations, under its class name.
+
+    If <precompute> is True, its checkout times are tabulated once, so
+    time_to_checkout must depend on the number of items only. Otherwise
+    time_to_checkout is called for every costumer.
+
+    @type line_type: type
+    @type precompute: bool
+    @rtype: None
+    """
+    if precompute:
+        _build_service_times(line_type)
+    LINE_TYPES[line_type.__name__] = line_type
+
+
+for _line_type in (Cashier, Express, SelfServe):
+    register_line_type(_line_type, precompute=True)
@@ -0,0 +1,172 @@
+"""Assignment 1 - Parameter Sweeps
+
+This file runs the grocery store simulation over many store configurations
+against the same event trace, in parallel.
+
+The trace is parsed once, in the parent process, and placed in a block of
+shared memory in the binary trace format (see traces.py). Worker processes
+read its columns directly from that block instead of receiving a copy.
+
+Every row has the full statistics of GroceryStoreSimulation.run. The
+lockstep engine of batch.py is faster on traces without closures, but
+leaves the wait quantiles of its rows empty.
+
+It can also be run as a script, e.g.
+
+    python sweep.py events.txt config.json --cashier_count 2,3,4 \
+        --express_count 0,1
+
+which prints one tab-separated row of statistics per configuration.
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+from multiprocessing import Pool
+from simulation import GroceryStoreSimulation
+from traces import shared_trace, attach_shared_trace
+
+# The configuration keys which can be swept.
+PARAMETERS = ('cashier_count', 'express_count', 'self_serve_count',
+              'line_capacity')
+
+# The trace being simulated, in a worker process.
+_trace = None
+
+
+def config_grid(base, choices):
+    """Return every configuration obtained by setting the keys of <choices>
+    in <base> to one of their values.
+
+    >>> grid = config_grid({'line_capacity': 5},
+    ...                    {'cashier_count': [1, 2], 'express_count': [0]})
+    >>> [(c['cashier_count'], c['express_count']) for c in grid]
+    [(1, 0), (2, 0)]
+
+    @type base: dict[str, object]
+    @type choices: dict[str, list[object]]
+    @rtype: list[dict[str, object]]
+    """
+    keys = sorted(choices)
+    configs = []
+    for values in itertools.product(*[choices[key] for key in keys]):
+        config = dict(base)
+        config.update(zip(keys, values))
+        configs.append(config)
+    return configs
+
+
+def _attach(name):
+    """Attach this worker process to the trace in shared memory <name>.
+
+    @type name: str
+    @rtype: None
+    """
+    global _trace
+    _trace = attach_shared_trace(name)
+
+
+def _simulate(config):
+    """Return the table row of one simulation of <config> on _trace.
+
+    @type config: dict[str, object]
+    @rtype: dict[str, object]
+    """
+    try:
+        stats = GroceryStoreSimulation(config).run(_trace)
+    except IndexError as error:
+        # The store could not take every costumer.
+        return stats_row(config, None, str(error))
+    return stats_row(config, stats)
+
+
+def stats_row(config, stats, error=None):
+    """Return a flat table row holding <config> and the statistics <stats>
+    returned by GroceryStoreSimulation.run or batch.simulate_batch.
+
+    If the simulation failed, <stats> is None, the statistics are left
+    empty and <error> describes the failure. simulate_batch does not
+    compute the wait quantiles, so the wait_p50, wait_p95 and wait_p99 of
+    its rows are empty too.
+
+    @type config: dict[str, object]
+    @type stats: dict[str, object] | None
+    @type error: str | None
+    @rtype: dict[str, object]
+    """
+    row = dict(config)
+    for key in ('num_customers', 'total_time', 'max_wait'):
+        row[key] = None if stats is None else stats[key]
+    for key in ('mean', 'variance', 'p50', 'p95', 'p99'):
+        if stats is None:
+            row['wait_' + key] = None
+        else:
+            row['wait_' + key] = stats['wait_stats'][key]
+    row['error'] = error
+    return row
+
+
+def sweep(configs, event_file, processes=None):
+    """Simulate each configuration of <configs> on the events of
+    <event_file>, using a pool of <processes> worker processes.
+
+    Return one table row per configuration, in the order of <configs>.
+
+    @type configs: list[dict[str, object]]
+    @type event_file: str | Trace
+        A text event file, a binary trace file or a Trace.
+    @type processes: int | None
+        The number of worker processes; the number of CPUs if None.
+    @rtype: list[dict[str, object]]
+    """
+    with shared_trace(event_file) as name, \
+            Pool(processes, initializer=_attach, initargs=(name,)) as pool:
+        return pool.map(_simulate, configs, chunksize=1)
+
+
+def write_table(rows, file):
+    """Write <rows> to <file> as tab-separated values with a header.
+
+    @type rows: list[dict[str, object]]
+    @type file: file
+    @rtype: None
+    """
+    if not rows:
+        return
+    writer = csv.DictWriter(file, fieldnames=list(rows[0]),
+                            delimiter='\t', lineterminator='\n')
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def main(argv=None):
+    """Run a sweep from the command line arguments <argv>.
+
+    @type argv: list[str] | None
+    @rtype: None
+    """
+    parser = argparse.ArgumentParser(
+        description='Simulate a grid of grocery store configurations.')
+    parser.add_argument('event_file')
+    parser.add_argument('config_file',
+                        help='the configuration the grid is built around')
+    for name in PARAMETERS:
+        parser.add_argument('--' + name, metavar='N[,N...]',
+                            help='values of {} to try'.format(name))
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with open(args.config_file, 'r') as file:
+        base = json.load(file)
+    choices = {}
+    for name in PARAMETERS:
+        values = getattr(args, name)
+        if values is not None:
+            choices[name] = [int(value) for value in values.split(',')]
+    rows = sweep(config_grid(base, choices), args.event_file, args.processes)
+    write_table(rows, sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
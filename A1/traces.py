@@ -0,0 +1,331 @@
+"""Assignment 1 - Event Traces
+
+This file contains a faster parser for the text event files used by the
+simulation, a compact binary format for event traces, which is loaded
+without parsing (see convert_event_file), and readers which accept either.
+
+A binary trace file starts with a 24-byte header: the magic bytes b'GST1',
+a 4-byte padding, the number of events and the length in bytes of the
+customer id table, as little-endian unsigned integers. Then follow a
+column of 8-byte signed timestamps, two columns of 4-byte signed integers
+(values and customer indices), a column of one-byte event kinds, and the
+customer id table encoded in UTF-8, one id per line.
+"""
+import gc
+import itertools
+import mmap
+import os
+import struct
+import sys
+from array import array
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from event import JoinLine, CloseLine, iter_events
+from store import Costumer
+
+# The event kinds stored in a Trace.
+ARRIVE = 0
+CLOSE = 1
+
+_MAGIC = b'GST1'
+_HEADER = struct.Struct('<4s4xQQ')
+
+# The shared memory blocks this process attached to, by name, kept open
+# while their traces are used.
+_attached = {}
+
+
+def create_event_list_mmap(filename):
+    """Return a list of Events based on raw list of events in <filename>.
+
+    This is a drop-in replacement for event.create_event_list. The file is
+    memory-mapped and split into records as bytes in one pass, so it is
+    never decoded as a whole, and only customer ids are decoded. The events
+    form no reference cycles, so the cyclic garbage collector, which would
+    otherwise scan the growing list over and over, is paused while they
+    are built.
+
+    Precondition: the file stored at <filename> is in the format specified
+    by the assignment handout.
+
+    @type filename: str
+        The name of a file that contains the list of events.
+    @rtype: list[Event]
+    """
+    with open(filename, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            records = buf[:].split(b'\n')
+    events = []
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for record in records:
+            fields = record.split()
+            if not fields:
+                continue
+            if fields[1] == b'Arrive':
+                event = JoinLine(int(fields[0]))
+                event.cos = Costumer(fields[2].decode(), int(fields[-1]))
+            else:
+                event = CloseLine(int(fields[0]))
+                event.line = int(fields[-1])
+                # See the comment in simulation.py regarding the line above.
+            events.append(event)
+    finally:
+        if collecting:
+            gc.enable()
+    return events
+
+
+class Trace:
+    """An event trace stored as packed columns.
+
+    Event i of the trace is described by the i-th entry of each column.
+
+    === Attributes ===
+    @type timestamps: array[int] | memoryview
+        The timestamp of each event.
+    @type kinds: array[int] | memoryview
+        The kind of each event, either ARRIVE or CLOSE.
+    @type values: array[int] | memoryview
+        For arrivals, the number of items of the customer; for closures,
+        the index of the line that closes.
+    @type costumers: array[int] | memoryview
+        For arrivals, the index in <ids> of the customer's id; -1 for
+        closures.
+    @type ids: list[str]
+        The table of customer ids, each stored once.
+    """
+    def __init__(self):
+        """Initialize an empty Trace.
+
+        @type self: Trace
+        @rtype: None
+        """
+        self.timestamps = array('q')
+        self.kinds = array('b')
+        self.values = array('i')
+        self.costumers = array('i')
+        self.ids = []
+
+    def __len__(self):
+        """Return the number of events in this Trace.
+
+        @type self: Trace
+        @rtype: int
+        """
+        return len(self.timestamps)
+
+    def events(self, start=0):
+        """Yield the Events of this Trace, starting with event <start>.
+
+        @type self: Trace
+        @type start: int
+        @rtype: generator[Event]
+        """
+        timestamps = self.timestamps
+        kinds = self.kinds
+        values = self.values
+        costumers = self.costumers
+        ids = self.ids
+        for i in range(start, len(timestamps)):
+            if kinds[i] == ARRIVE:
+                event = JoinLine(timestamps[i])
+                event.cos = Costumer(ids[costumers[i]], values[i])
+            else:
+                event = CloseLine(timestamps[i])
+                event.line = values[i]
+                # See the comment in simulation.py regarding the line above.
+            yield event
+
+    def to_bytes(self):
+        """Return this Trace encoded in the binary trace format.
+
+        @type self: Trace
+        @rtype: bytes
+        """
+        table = '\n'.join(self.ids).encode()
+        parts = [_HEADER.pack(_MAGIC, len(self), len(table))]
+        for code, column in [('q', self.timestamps), ('i', self.values),
+                             ('i', self.costumers)]:
+            column = array(code, column)
+            if sys.byteorder == 'big':
+                column.byteswap()
+            parts.append(column.tobytes())
+        parts.append(bytes(self.kinds))
+        parts.append(table)
+        return b''.join(parts)
+
+
+def trace_from_buffer(buf):
+    """Return the Trace encoded in the binary trace format in <buf>.
+
+    The columns of the returned Trace are views into <buf>, not copies, so
+    <buf> may be a memory map or a block of shared memory.
+
+    @type buf: bytes | bytearray | mmap | memoryview
+    @rtype: Trace
+    """
+    view = memoryview(buf).cast('B')
+    magic, count, table_size = _HEADER.unpack_from(view)
+    if magic != _MAGIC:
+        raise ValueError('not a binary event trace')
+    if sys.byteorder == 'big':
+        raise ValueError('binary event traces can only be read on '
+                         'little-endian machines')
+    trace = Trace()
+    offset = _HEADER.size
+    columns = []
+    for code, size in [('q', 8), ('i', 4), ('i', 4)]:
+        columns.append(view[offset:offset + size * count].cast(code))
+        offset += size * count
+    trace.timestamps, trace.values, trace.costumers = columns
+    trace.kinds = view[offset:offset + count].cast('b')
+    offset += count
+    table = bytes(view[offset:offset + table_size]).decode()
+    trace.ids = table.split('\n') if table else []
+    return trace
+
+
+@contextmanager
+def shared_trace(source):
+    """Place the trace of <source> in a block of shared memory, in the
+    binary trace format, and yield the name of the block.
+
+    Other processes read the trace with attach_shared_trace. The block is
+    released when the with statement ends.
+
+    @type source: str | Trace
+        A text event file, a binary trace file or a Trace.
+    @rtype: iterator[str]
+    """
+    data = as_trace(source).to_bytes()
+    block = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        block.buf[:len(data)] = data
+        yield block.name
+    finally:
+        block.close()
+        block.unlink()
+
+
+def attach_shared_trace(name):
+    """Return the Trace placed in the shared memory block <name> by
+    shared_trace.
+
+    The columns of the Trace are views into the block, which stays open for
+    the rest of this process.
+
+    @type name: str
+    @rtype: Trace
+    """
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return trace_from_buffer(_attached[name].buf)
+
+
+def build_trace(events):
+    """Return a Trace holding <events>.
+
+    Equal customer ids share one entry of the id table.
+
+    Precondition: <events> is sorted by timestamp.
+
+    @type events: iterable[Event]
+    @rtype: Trace
+    """
+    trace = Trace()
+    interned = {}
+    for event in events:
+        trace.timestamps.append(event.timestamp)
+        if type(event) is JoinLine:
+            index = interned.get(event.cos.id)
+            if index is None:
+                index = interned[event.cos.id] = len(trace.ids)
+                trace.ids.append(event.cos.id)
+            trace.kinds.append(ARRIVE)
+            trace.values.append(event.cos.items)
+            trace.costumers.append(index)
+        else:
+            trace.kinds.append(CLOSE)
+            trace.values.append(event.line)
+            trace.costumers.append(-1)
+    return trace
+
+
+def convert_event_file(event_file, trace_file):
+    """Convert the text event file <event_file> into the binary trace
+    <trace_file>.
+
+    A ValueError is raised if <event_file> is not sorted by timestamp.
+
+    @type event_file: str
+    @type trace_file: str
+    @rtype: None
+    """
+    trace = build_trace(iter_events(event_file))
+    with open(trace_file, 'wb') as file:
+        file.write(trace.to_bytes())
+
+
+def load_trace(trace_file):
+    """Return the Trace stored in the binary trace file <trace_file>.
+
+    The file is memory-mapped rather than read.
+
+    @type trace_file: str
+    @rtype: Trace
+    """
+    with open(trace_file, 'rb') as file:
+        buf = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return trace_from_buffer(buf)
+
+
+def is_trace_file(filename):
+    """Return True iff <filename> is a binary trace file.
+
+    @type filename: str
+    @rtype: bool
+    """
+    with open(filename, 'rb') as file:
+        return file.read(len(_MAGIC)) == _MAGIC
+
+
+def as_trace(source):
+    """Return <source> parsed into a Trace.
+
+    @type source: Trace | str
+        A Trace, or the name of a binary trace file or of a text event file.
+    @rtype: Trace
+    """
+    if isinstance(source, Trace):
+        return source
+    if is_trace_file(source):
+        return load_trace(source)
+    return build_trace(iter_events(source))
+
+
+def open_events(source, start=0):
+    """Return an iterator over the Events of <source>, in order, starting
+    with event <start>.
+
+    <source> may be a Trace, the name of a binary trace file or the name of
+    a text event file. Skipping events of a text file means parsing them.
+
+    @type source: Trace | str
+    @type start: int
+    @rtype: iterator[Event]
+    """
+    if isinstance(source, Trace):
+        return source.events(start)
+    if is_trace_file(source):
+        return load_trace(source).events(start)
+    return itertools.islice(iter_events(source), start, None)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python traces.py EVENT_FILE TRACE_FILE')
+    convert_event_file(sys.argv[1], sys.argv[2])
@@ -0,0 +1,177 @@
+"""Assignment 1 - What-if Simulations
+
+This file answers questions like "what if two more Express lines had
+opened at time T?" without simulating the events before T once per
+question.
+
+The simulation runs up to time T once. Each variant of the store is then
+finished in a forked child process, which starts from a copy-on-write
+snapshot of the simulation at time T, so it only performs the events from
+T on. Where the platform cannot fork, each variant finishes a deep copy of
+the simulation instead, one after the other.
+
+A variant is a dictionary of changes made at time T:
+
+    {'open': {'Express': 2}, 'close': [0, 3]}
+
+opens two new Express lines and closes the lines with ids 0 and 3, as a
+Close event of the event file would at time T. Line types are named as in
+GroceryStore.open_line.
+"""
+import copy
+import os
+import pickle
+import traceback
+from simulation import GroceryStoreSimulation
+from traces import as_trace
+
+
+def apply_variant(simulation, variant, timestamp):
+    """Make the changes of <variant> to <simulation> at time <timestamp>.
+
+    @type simulation: GroceryStoreSimulation
+    @type variant: dict[str, object]
+    @type timestamp: int
+    @rtype: None
+    """
+    unknown = set(variant) - {'open', 'close'}
+    if unknown:
+        raise ValueError('unknown changes {}'.format(sorted(unknown)))
+    for line_type, count in sorted(variant.get('open', {}).items()):
+        for _ in range(count):
+            simulation.open_line(line_type)
+    for line_id in variant.get('close', []):
+        simulation.close_line(line_id, timestamp)
+
+
+def what_if(store_file, event_file, until, variants, processes=None,
+            **options):
+    """Simulate the store of <store_file> on <event_file> with each variant
+    of <variants> applied at time <until>.
+
+    Return the statistics of each variant, in order, as
+    GroceryStoreSimulation.run reports them, or None if some costumer could
+    not join any line. Any other error of a variant, such as closing a line
+    which the trace closes later, is raised.
+
+    With no changes, a variant finishes as a run which never stopped:
+
+    >>> import os, tempfile
+    >>> from generate import store_config, write_events
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> events = os.path.join(directory.name, 'events.txt')
+    >>> write_events(events, 2000, close_rate=0.002)
+    >>> full = GroceryStoreSimulation(store_config()).run(events)
+    >>> what_if(store_config(), events, 3000, [{}])[0] == full
+    True
+    >>> what_if(store_config(), events, 3000, [{}, {'close': [0, 0]}])
+    Traceback (most recent call last):
+    ...
+    ValueError: line 0 is already closed
+    >>> directory.cleanup()
+
+    @type store_file: str | dict[str, object]
+    @type event_file: str | Trace
+        A text event file, a binary trace file or a Trace. It is parsed
+        once, before the simulation starts.
+    @type until: int
+        The time the variants are applied at; the events due before it are
+        performed once for all variants.
+    @type variants: list[dict[str, object]]
+    @type processes: int | None
+        The most variants simulated at once; the number of CPUs if None.
+    @type options: dict[str, object]
+        Passed on to GroceryStoreSimulation, except costumer_file, which
+        the variants cannot share.
+    @rtype: list[dict[str, object] | None]
+    """
+    if options.get('costumer_file') is not None:
+        raise ValueError('variants cannot share a costumer file')
+    trace = as_trace(event_file)
+    prefix = GroceryStoreSimulation(store_file, **options)
+    try:
+        prefix.advance(trace, until)
+    except IndexError:
+        # Every variant fails before it starts.
+        return [None] * len(variants)
+    if hasattr(os, 'fork'):
+        return _fork_variants(prefix, trace, until, variants,
+                              processes or os.cpu_count() or 1)
+    return [_finish(copy.deepcopy(prefix), trace, until, variant)
+            for variant in variants]
+
+
+def _finish(simulation, trace, until, variant):
+    """Apply <variant> to <simulation> at time <until>, and return the
+    statistics of the rest of its run on <trace>, or None if some costumer
+    could not join any line.
+
+    @type simulation: GroceryStoreSimulation
+    @type trace: Trace
+    @type until: int
+    @type variant: dict[str, object]
+    @rtype: dict[str, object] | None
+    """
+    apply_variant(simulation, variant, until)
+    try:
+        return simulation.resume(trace)
+    except IndexError:
+        return None
+
+
+def _fork_variants(prefix, trace, until, variants, processes):
+    """Finish a copy of <prefix> for each variant of <variants>, each in a
+    forked child process, with at most <processes> children at once.
+
+    Return the statistics of each variant, in order, as _finish does, or
+    raise the error of the first variant which failed.
+
+    @type prefix: GroceryStoreSimulation
+    @type trace: Trace
+    @type until: int
+    @type variants: list[dict[str, object]]
+    @type processes: int
+    @rtype: list[dict[str, object] | None]
+    """
+    results = [None] * len(variants)
+    # The index of the variant, and the pipe to read its statistics from,
+    # of each running child, in the order they started.
+    running = {}
+    started = 0
+    while started < len(variants) or running:
+        while started < len(variants) and len(running) < processes:
+            read, write = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                os.close(read)
+                status = 0
+                try:
+                    # The child sends back whether the variant finished,
+                    # and its statistics or the error it raised.
+                    try:
+                        outcome = (True, _finish(prefix, trace, until,
+                                                 variants[started]))
+                    except Exception as error:
+                        outcome = (False, error)
+                    data = pickle.dumps(outcome)
+                    with os.fdopen(write, 'wb') as file:
+                        file.write(data)
+                except BaseException:
+                    traceback.print_exc()
+                    status = 1
+                os._exit(status)
+            os.close(write)
+            running[pid] = (started, read)
+            started += 1
+        pid = next(iter(running))
+        index, read = running.pop(pid)
+        with os.fdopen(read, 'rb') as file:
+            data = file.read()
+        _, status = os.waitpid(pid, 0)
+        if status != 0:
+            raise RuntimeError('simulating variant {} failed'.format(index))
+        results[index] = pickle.loads(data)
+    for finished, result in results:
+        if not finished:
+            raise result
+    return [result for _, result in results]